@@ -1,4 +1,5 @@
 import math
+import multiprocessing
 import tkinter as tk
 import tkinter.font as font
 from tkinter import messagebox
@@ -161,4 +162,6 @@ def resize_canvas(event, canvas, start_color, end_color):
         canvas.create_rectangle(0, y, width, y + 1, fill=color, outline="", tags="gradient")
 
 if __name__ == "__main__":
+    # Lets the optimiser's worker processes start up properly in the frozen executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
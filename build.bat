@@ -16,6 +16,15 @@ if %errorlevel% neq 0 (
     exit /b 1
 )
 
+:: Build (or carry on building) the layout atlas bundled in src/assets if asked to with --atlas
+if "%1"=="--atlas" (
+    python -m src.Playerless_Core_Tools_Backend
+    if errorlevel 1 (
+        echo "Building the layout atlas failed. Exiting."
+        exit /b 1
+    )
+)
+
 :: Build with PyInstaller
 pyinstaller ^
 --add-data "src/images/*;src/images" ^
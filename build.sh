@@ -19,6 +19,15 @@ fi
 # Optional: extract version if needed
 # version=$(python3 -c "from src.Assets.version import version; print(version)")
 
+# Build (or carry on building) the layout atlas bundled in src/Assets if asked to with --atlas
+if [ "$1" == "--atlas" ]; then
+    python -m src.Playerless_Core_Tools_Backend
+    if [ $? -ne 0 ]; then
+        echo "Building the layout atlas failed. Exiting."
+        exit 1
+    fi
+fi
+
 # Run PyInstaller
 pyinstaller \
 --add-data "src/Images/*:src/Images" \
@@ -5,7 +5,6 @@ YES_OPTIONS = {"y", "yes", "on", "1", "yeah", "true", "sure", "yup",
                "ja", "si", "sí", "haan", "हाँ", "oui", "はい", "da"}
 WARP_OPTIONS = {"blue", "b", "warped", "w", "warp"}
 CRMS_OPTIONS = {"red", "r", "crimson", "c", "crim"}
-BASE_CPU_ITER_TIME = 5.5e-4
 WARPED: NyliumType = 0
 CRIMSON: NyliumType = 1
 UNCLEARED: ClearedStatus = 0
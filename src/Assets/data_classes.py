@@ -50,6 +50,14 @@ class PlayerlessCore:
     blast_chamber_effic: float
     run_time: int
     additional_property: bool # For future use
+    # Float type the optimiser's engines work in, "float32" trades a little accuracy for speed
+    engine_dtype: str = "float64"
+    # Name of the engine backend to use, see ENGINE_BACKENDS
+    engine_backend: str = "numpy"
+    # Name of the optimiser to use, see OPTIMISERS
+    optimiser: str = "annealing"
+    # What the optimiser maximises, "fungi" (desired fungi) or "wart_blocks"
+    objective: str = "fungi"
         
     def to_yaml(self, file_path: str):
         with open(file_path, 'w') as file:
@@ -80,6 +88,10 @@ class PlayerlessCore:
         print(f"blast_chamber_effic: {type(self.blast_chamber_effic)}")
         print(f"run_time: {type(self.run_time)}")
         print(f"additional_property: {type(self.additional_property)}")
+        print(f"engine_dtype: {type(self.engine_dtype)}")
+        print(f"engine_backend: {type(self.engine_backend)}")
+        print(f"optimiser: {type(self.optimiser)}")
+        print(f"objective: {type(self.objective)}")
     
     def print_values(self):
         print(f"num_disps: {self.num_disps}")
@@ -92,6 +104,10 @@ class PlayerlessCore:
         print(f"blast_chamber_effic: {self.blast_chamber_effic}")
         print(f"run_time: {self.run_time}")
         print(f"additional_property: {self.additional_property}")
+        print(f"engine_dtype: {self.engine_dtype}")
+        print(f"engine_backend: {self.engine_backend}")
+        print(f"optimiser: {self.optimiser}")
+        print(f"objective: {self.objective}")
 
 @dataclass
 class PlayerlessCoreOutput:
@@ -100,18 +116,19 @@ class PlayerlessCoreOutput:
     bm_for_prod: float
     bm_for_grow: float
     bm_total: float
-    disp_foliage_grids: np.ndarray
-    disp_des_fungi_grids: np.ndarray
+    total_des_fungi_grid: np.ndarray
+    # Per dispenser breakdown of the distribution, if it was asked for (see DistBreakdown)
+    breakdown: Any = None
 
 @dataclass
 class PlayerlessCoreDistOutput:
     total_foliage_grid: np.ndarray
     total_des_fungi_grid: np.ndarray
-    disp_foliage_grids: np.ndarray
-    disp_des_fungi_grids: np.ndarray
     sprouts_grid: np.ndarray
     twisting_grid: np.ndarray
     bm_for_prod: float
+    # Per dispenser breakdown of the distribution, if it was asked for (see DistBreakdown)
+    breakdown: Any = None
 
 @dataclass
 class PlayerfulCore:
@@ -132,6 +149,22 @@ class PlayerfulCoreOutput:
     vrm2s: int
     vrm3s: int 
 
+@dataclass
+class ProgressSnapshot:
+    iteration: int
+    temperature: float
+    best_solution: Any
+    optimal_energy: float
+
+# Best layout recorded for a configuration, and how much optimising's been spent on it in total
+@dataclass
+class StoredOptimum:
+    disp_coords: List[Dispenser]
+    energy: float
+    iterations: int
+    total_time: float
+    num_runs: int
+
 @dataclass    
 class DisplayInfo:
     output_label: Dict
@@ -152,3 +185,28 @@ class SimAnnealingParams:
     end_temp: float
     cooling_rate: float
     max_iterations: int
+    # Evaluates a whole (N, num_disps, 3) array of layouts at once, for the population optimisers
+    batch_optimise_func: Callable = None
+    # Wall clock time (from time.time) the optimisers need to finish by, shared by all processes
+    end_time: float = None
+    iterations: int = 0
+    # Seeded numpy.random.Generator every random choice an optimiser makes is drawn from, set by
+    # annealing_chain before the optimiser runs
+    rng: Any = None
+    # Symmetry-canonical evaluation cache statistics
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # Neighbouring solutions moved to and not, over all of an optimiser's chains or replicas
+    moves_accepted: int = 0
+    moves_rejected: int = 0
+    # Latest few best solutions, re-scored exactly at the end when optimising a surrogate
+    candidates: List[Any] = field(default_factory=list)
+    # ParetoArchive every evaluated layout is offered to, if there is one
+    archive: Any = None
+
+@dataclass
+class EngineBackend:
+    name: str
+    calc_fung_dist: Callable
+    batch_calc_fung_dist: Callable
+    calc_huge_fungus_grids: Callable
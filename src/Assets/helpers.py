@@ -1,7 +1,6 @@
 import os
 import sys
 import time
-import itertools
 
 import xlsxwriter
 import numpy as np
@@ -14,6 +13,8 @@ from src.Assets import heatmap_data
 from src.Assets.constants import *
 from src.Assets.version import version
 from src.Assets.data_classes import PlayerfulCoreOutput, Dimensions
+from src.Fast_Dispenser_Distribution import calc_huge_fungus_grids
+from src.Assets.instrumentation import instrument, count
 
 try:
     from ctypes import windll
@@ -28,6 +29,8 @@ VALID_ENCODING_BLOCKS = {'minecraft:red_concrete', 'minecraft:blue_concrete',
                          'minecraft:cyan_concrete','minecraft:light_blue_concrete'}
 STEMS_SHEET_IDX = 0
 SHROOMS_SHEET_IDX = 1
+HEATMAP_EXPORT_NAME = "weighted_fungi_heatmap"
+HEATMAP_EXPORT_FORMATS = ("xlsx", "npy", "csv")
 
 class ToolTip:
     def __init__(self, widget, tooltip_text):
@@ -146,62 +149,56 @@ def get_cell_value(sheet_name, row_number, column_number):
     """Return the value of the cell at the given row and column in the given sheet."""
     return heatmap_data.heatmap_array[sheet_name][row_number][column_number]
 
-def export_custom_heatmaps(p: Dimensions, des_fungi_grid):
+def heatmap_export_paths(file_format: str) -> List[str]:
+    """Return the file(s) export_custom_heatmaps writes to for a given file format"""
+    if file_format == "csv":
+        return [f"{HEATMAP_EXPORT_NAME} ({block_type}).csv" for block_type in BLOCK_TYPES]
+    return [f"{HEATMAP_EXPORT_NAME}.{file_format}"]
+
+@instrument()
+def export_custom_heatmaps(p: Dimensions, des_fungi_grid, file_format: str = "xlsx"):
     """
     Export the custom nether tree heatmap data, generated\n 
     from the dispenser placements, to an Excel file.
     Params:
     - p: Dimensions object containing the dimensions of the platform
     - des_fungi_grid: 2D array of the des fungi grid
+    - file_format: 'xlsx' for an Excel workbook with a sheet per block type, 'npy' for a single
+      (block type, y, col) numpy array, or 'csv' for a plain csv file per block type
     """
     try:
-        outSheet = []
-        outWorkbook = xlsxwriter.Workbook(r"weighted_fungi_heatmap.xlsx")
+        if file_format not in HEATMAP_EXPORT_FORMATS:
+            raise ValueError(f"Unsupported heatmap file format '{file_format}'")
         start_time = time.time()
-        
-        hf = Dimensions(
-            NT_MAX_RAD + p.length + NT_MAX_RAD,
-            NT_MAX_RAD + p.width + NT_MAX_RAD
-        )
-        hf_grids = np.zeros((
-            len(BLOCK_TYPES) + 1, 
-            hf.length,
-            hf.width,
-            NT_MAX_HT
-        ))
-    
-        # Iterate through each x,z coord in the nylium grid/platform 
-        for nylium_x, nylium_z in itertools.product(range(p.width), range(p.length)):
-            # Generation order is Stems -> Shrooms -> Warts
-            for b in range(len((BLOCK_TYPES))):
-                fungus_chance = des_fungi_grid[nylium_x][nylium_z]
-                # Iterate through each x,y,z coord relative to the fungi
-                y_range, z_range, x_range = range(NT_MAX_HT), range(NT_MAX_WD), range(NT_MAX_WD)
-                for y, z, x in itertools.product(y_range, z_range, x_range):
-                    col = x + (NT_MAX_WD * z)
-                    row = NT_MAX_HT - 1 - y
-                    
-                    weighted_chance = fungus_chance * get_cell_value(b, row, col)
-                    curr = hf_grids[3][nylium_z + z][nylium_x + x][y]
-
-                    gen_chance = (1 - curr) * weighted_chance
-                    hf_grids[b][nylium_z + z][nylium_x + x][y] += gen_chance
-                    hf_grids[3][nylium_z + z][nylium_x + x][y] += gen_chance
-
-        # Write data to Excel file for each block type
-        y_range, z_range, x_range = range(NT_MAX_HT), range(hf.width), range(hf.length)
-        for b, block_type in enumerate(BLOCK_TYPES):   # 0 = stems, 1 = shrooms, 2 = vrm0/warts
-            outSheet.append(outWorkbook.add_worksheet(block_type))
-            for y, z, x in itertools.product(y_range, z_range, x_range):
-                col = z + (hf.width * x)
-                row = NT_MAX_HT - 1 - y
-                heatmap_data_point = hf_grids[b][x][z][y]
-                outSheet[b].write(row, col, heatmap_data_point)
-                        
+
+        # The platform size is implied by the grid, p is just kept for callers
+        hf_grids = calc_huge_fungus_grids(np.asarray(des_fungi_grid))
+        # 3D data is stored in 'slices' on a 2D sheet, with each row being a y level from the top
+        # down, and each of the z columns of an x slice sitting next to each other
+        sheets = [
+            hf_grids[b].reshape(-1, NT_MAX_HT).T[::-1] for b in range(len(BLOCK_TYPES))
+        ]
+
+        paths = heatmap_export_paths(file_format)
+        if file_format == "npy":
+            np.save(paths[0], np.stack(sheets))
+        elif file_format == "csv":
+            for path, sheet in zip(paths, sheets):
+                np.savetxt(path, sheet, delimiter=",")
+        else:
+            # Constant memory mode streams each row straight to disk, so rows have to be written
+            # in order, but it stops big platforms from building up a huge workbook in memory
+            outWorkbook = xlsxwriter.Workbook(paths[0], {'constant_memory': True})
+            # 0 = stems, 1 = shrooms, 2 = vrm0/warts
+            for block_type, sheet in zip(BLOCK_TYPES, sheets):
+                outSheet = outWorkbook.add_worksheet(block_type)
+                for row, row_data in enumerate(sheet.tolist()):
+                    outSheet.write_row(row, 0, row_data)
+            outWorkbook.close()
+
         end_time = time.time()
         elapsed_time = end_time - start_time
-        print(f"Heatmap data calculated and output to excel file in {elapsed_time} seconds")
-        outWorkbook.close()
+        print(f"Heatmap data calculated and output to {', '.join(paths)} in {elapsed_time} seconds")
         return 0
     except Exception as e:
         print(f"Error occurred whilst exporting heatmaps: {e}")
@@ -225,6 +222,7 @@ def stems_and_shrooms(average_stems, average_shroomlights,
     
     return average_stems, average_shroomlights
 
+@instrument()
 def schem_layout_to_rates_data(path, hat_cycles, trunk_cycles):
     """A helper function that takes an input of a 7x27x7 (XYZ) schematic in the .litematic format, representing the blocks a
     given nether tree farm layout harvests per cycle, and decodes the 3D data inside that file to compare it to
@@ -296,6 +294,7 @@ def schem_layout_to_rates_data(path, hat_cycles, trunk_cycles):
                     ((AVG_WARTS - AVG_TOP_WART) / hat_cycles + 
                     AVG_TOP_WART / trunk_cycles))
 
+    count("schematic blocks decoded", len(Xrange) * len(Yrange) * len(Zrange))
     print("Elapsed time:", time.time() - start_time, "seconds")
 
     return avg_stems, avg_shroomlights, avg_wart_blocks, stem_E, shroomlight_E, wart_block_E
@@ -306,6 +305,7 @@ def get_cell_value(sheet_name2: str, row_number: int, column_number: int) -> flo
     """
     return heatmap_data.heatmap_array[sheet_name2][row_number][column_number]
 
+@instrument()
 def schem_layout_to_efficiency_and_vrms(path: str | None) -> PlayerfulCoreOutput:
     """
     A helper function that takes an input of a 7x27x7 (XYZ) schematic in the .litematic format, representing the blocks a
@@ -374,6 +374,7 @@ def schem_layout_to_efficiency_and_vrms(path: str | None) -> PlayerfulCoreOutput
     out.wb_per_fungus = out.avg_warts / AVG_WARTS
     # wart blocks max doesn't take into account vrm and the actual max warts including VRM is around 82 but that's infeasible in reality
 
+    count("schematic blocks decoded", len(Xrange) * len(Yrange) * len(Zrange))
     print(f"Elapsed time: {time.time() - start_time} seconds")
     return out
 
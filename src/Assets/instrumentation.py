@@ -0,0 +1,139 @@
+"""
+Lightweight timing and counter instrumentation of the calculation pipeline, off unless the
+STEMLIGHT_INSTRUMENTATION environment variable is set to the path to write its results to,
+e.g. STEMLIGHT_INSTRUMENTATION=profile writes profile.json and profile.trace.json on exit.\n
+Spans time named blocks of code, either with 'with span(name):' or by decorating a function with
+'@instrument()', and counters add up named quantities with count(name, n). Spans are summarised
+per name in the JSON export, and every one (up to MAX_TRACE_EVENTS) goes in the trace export,
+which is in the Chrome trace event format that chrome://tracing, Perfetto and speedscope show as
+a flame graph.\n
+When it's off, instrument() hands back the function it's given untouched and span() and count()
+do nothing, so instrumented code runs exactly as if it wasn't. Only the main process records, as
+worker processes never get to export anything, so whatever they do is counted from the results
+they send back instead.
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+import multiprocessing
+from contextlib import nullcontext
+
+INSTRUMENTATION_ENV_VAR = "STEMLIGHT_INSTRUMENTATION"
+# Most spans kept for the trace export, after which they're only summarised
+MAX_TRACE_EVENTS = 200000
+
+OUTPUT_PATH = os.environ.get(INSTRUMENTATION_ENV_VAR, "")
+ENABLED = OUTPUT_PATH not in ("", "0") and multiprocessing.parent_process() is None
+
+# (name, start, duration, thread id) of each span, in perf_counter nanoseconds
+trace_events = []
+# Number of spans, total and max duration in nanoseconds, by name
+span_stats = {}
+counters = {}
+lock = threading.Lock()
+# What span gives back when instrumentation's off
+NULL_SPAN = nullcontext()
+start_ns = time.perf_counter_ns()
+
+class Span:
+    """Times the block of code it's entered for, recording it when it exits"""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        duration = time.perf_counter_ns() - self.start
+        with lock:
+            stats = span_stats.get(self.name)
+            if stats is None:
+                span_stats[self.name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+            if len(trace_events) < MAX_TRACE_EVENTS:
+                trace_events.append((self.name, self.start, duration, threading.get_ident()))
+        return False
+
+def span(name: str):
+    """Context manager timing the code inside it as a span called 'name'"""
+    return Span(name) if ENABLED else NULL_SPAN
+
+def count(name: str, n=1):
+    """Add n to the counter called 'name'"""
+    if ENABLED:
+        with lock:
+            counters[name] = counters.get(name, 0) + n
+
+def instrument(name: str = None):
+    """Decorator timing every call of a function as a span, called 'name' or the function's
+    qualified name. Leaves the function as it is if instrumentation's off"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        span_name = func.__qualname__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summary() -> dict:
+    """Get the span statistics (in seconds) and counters recorded so far"""
+    with lock:
+        spans = {
+            name: {"count": num, "total_s": total / 1e9, "mean_s": total / num / 1e9,
+                   "max_s": longest / 1e9}
+            for name, (num, total, longest) in span_stats.items()
+        }
+        return {"spans": spans, "counters": dict(counters)}
+
+def export_json(path: str):
+    """Write the span statistics and counters to a JSON file"""
+    with open(path, "w") as file:
+        json.dump(summary(), file, indent=2)
+
+def export_trace(path: str):
+    """Write every span recorded to a Chrome trace event format JSON file, with the counters'
+    final values at the end"""
+    pid = os.getpid()
+    with lock:
+        events = [
+            {"name": name, "ph": "X", "ts": (start - start_ns) / 1e3, "dur": duration / 1e3,
+             "pid": pid, "tid": tid}
+            for name, start, duration, tid in trace_events
+        ]
+        end_ts = (time.perf_counter_ns() - start_ns) / 1e3
+        events += [{"name": name, "ph": "C", "ts": end_ts, "pid": pid, "args": {name: value}}
+                   for name, value in counters.items()]
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+def reset():
+    """Forget everything recorded so far"""
+    with lock:
+        trace_events.clear()
+        span_stats.clear()
+        counters.clear()
+
+def export_on_exit():
+    """Export everything recorded to OUTPUT_PATH.json and OUTPUT_PATH.trace.json"""
+    try:
+        export_json(f"{OUTPUT_PATH}.json")
+        export_trace(f"{OUTPUT_PATH}.trace.json")
+    except OSError as e:
+        print("An error has occured whilst exporting instrumentation:", e)
+
+if ENABLED:
+    atexit.register(export_on_exit)
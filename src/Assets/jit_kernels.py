@@ -0,0 +1,132 @@
+"""
+Optional JIT-compiled versions of the foliage and huge fungus engines' hot loops.\n
+Only used when numba is installed, looping cell by cell over the 5x5 area around each dispenser
+(and the 7x7x27 area around each fungus) with no function calls or temporary arrays.
+The maths and its order is kept the same as Fast_Dispenser_Distribution.py so the results match.
+"""
+import numpy as np
+
+from src.Assets.constants import *
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Leave the kernels as plain (slow) python functions if numba isn't installed"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def crimson_fung_dist_kernel(foliage_grid, disp_coords, cycles, open_mask, sel_cache,
+                             compost_effic=1.0):
+    """Compiled fast_calc_fung_dist for crimson nylium, filling in the given foliage grid.
+    See batch_calc_fung_dist for 'compost_effic'"""
+    length, width = foliage_grid.shape
+    bm_for_prod = 0.0
+    for _ in range(cycles):
+        for d in range(disp_coords.shape[0]):
+            disp_row, disp_col = disp_coords[d, 0], disp_coords[d, 1]
+            disp_chance = 1 - foliage_grid[disp_row, disp_col]
+            bm_for_prod += disp_chance
+
+            for row in range(max(disp_row - 2, 0), min(disp_row + 3, length)):
+                for col in range(max(disp_col - 2, 0), min(disp_col + 3, width)):
+                    # Nothing can grow on blocked blocks
+                    if not open_mask[row, col]:
+                        continue
+                    sel_chance = sel_cache[abs(row - disp_row), abs(col - disp_col)]
+                    # Don't double multiply the air chance above a selected dispenser
+                    air_chance = 1.0 if row == disp_row and col == disp_col else disp_chance
+                    foliage_grid[row, col] += (1 - foliage_grid[row, col]) * air_chance \
+                                              * sel_chance
+
+        # Replicate triggering pistons to clear foliage on top of selected dispensers
+        for d in range(disp_coords.shape[0]):
+            if disp_coords[d, 2] == CLEARED:
+                foliage_grid[disp_coords[d, 0], disp_coords[d, 1]] = 0
+
+    total_foliage = np.sum(foliage_grid)
+    bm_from_compost = compost_effic * (8 / 9 * total_foliage) / FOLIAGE_PER_BM
+    return total_foliage / 9, bm_for_prod - bm_from_compost
+
+@njit(cache=True)
+def warped_fung_dist_kernel(foliage_grid, des_fungi_grid, sprouts_grid, twisting_grid,
+                            disp_coords, cycles, open_mask, sel_cache, compost_effic=1.0):
+    """Compiled fast_calc_fung_dist for warped nylium, filling in the given grids"""
+    length, width = foliage_grid.shape
+    bm_for_prod = 0.0
+    for _ in range(cycles):
+        for d in range(disp_coords.shape[0]):
+            disp_row, disp_col = disp_coords[d, 0], disp_coords[d, 1]
+            disp_chance = 1 - foliage_grid[disp_row, disp_col]
+            bm_for_prod += disp_chance
+
+            for row in range(max(disp_row - 2, 0), min(disp_row + 3, length)):
+                for col in range(max(disp_col - 2, 0), min(disp_col + 3, width)):
+                    if not open_mask[row, col]:
+                        continue
+                    sel_chance = sel_cache[abs(row - disp_row), abs(col - disp_col)]
+                    air_chance = 1.0 if row == disp_row and col == disp_col else disp_chance
+                    foliage_chance = sel_chance * air_chance
+
+                    des_fungi_grid[row, col] += (1 - foliage_grid[row, col]) * foliage_chance \
+                                                * WARP_FUNG_CHANCE
+                    foliage_grid[row, col] += (1 - foliage_grid[row, col]) * foliage_chance
+                    # As it's warped nylium, generate sprouts
+                    sprouts_chance = (1 - foliage_grid[row, col]) * foliage_chance
+                    foliage_grid[row, col] += sprouts_chance
+                    sprouts_grid[row, col] += sprouts_chance
+
+            # Twisting vines can land anywhere on the platform
+            new_disp_chance = 1 - foliage_grid[disp_row, disp_col]
+            for row in range(length):
+                for col in range(width):
+                    if row == disp_row and col == disp_col:
+                        twisting_chance = (1 - foliage_grid[row, col]) * TWISTING_SEL_CHANCE
+                    else:
+                        twisting_chance = (1 - foliage_grid[row, col]) * TWISTING_SEL_CHANCE \
+                                          * new_disp_chance
+                    foliage_grid[row, col] += twisting_chance
+                    twisting_grid[row, col] += twisting_chance
+
+        for d in range(disp_coords.shape[0]):
+            if disp_coords[d, 2] == CLEARED:
+                disp_row, disp_col = disp_coords[d, 0], disp_coords[d, 1]
+                foliage_grid[disp_row, disp_col] = 0
+                des_fungi_grid[disp_row, disp_col] = 0
+                sprouts_grid[disp_row, disp_col] = 0
+                twisting_grid[disp_row, disp_col] = 0
+
+    total_des_fungi = np.sum(des_fungi_grid)
+    # Sprouts don't drop as an item here, and twisting vines only have a 1/3 chance of dropping
+    composted_plants = np.sum(foliage_grid - sprouts_grid - 2 * twisting_grid / 3) \
+                       - total_des_fungi
+    return total_des_fungi, bm_for_prod - compost_effic * composted_plants / FOLIAGE_PER_BM
+
+@njit(cache=True)
+def huge_fungus_grids_kernel(des_fungi_grid, hf_kernels, hf_grids):
+    """Compiled calc_huge_fungus_grids, filling in the given (4, W + 6, L + 6, 27) grids"""
+    p_length, p_width = des_fungi_grid.shape
+    num_block_types, kernel_wd, _, kernel_ht = hf_kernels.shape
+    # The total chance each block is occupied comes after the block types
+    occ = num_block_types
+    for nylium_x in range(p_length):
+        for nylium_z in range(p_width):
+            fungus_chance = des_fungi_grid[nylium_x, nylium_z]
+            if fungus_chance == 0:
+                continue
+            # Generation order is Stems -> Shrooms -> Warts
+            for b in range(num_block_types):
+                for z in range(kernel_wd):
+                    for x in range(kernel_wd):
+                        for y in range(kernel_ht):
+                            occupied = hf_grids[occ, nylium_z + z, nylium_x + x, y]
+                            gen_chance = (1 - occupied) * (fungus_chance * hf_kernels[b, z, x, y])
+                            hf_grids[b, nylium_z + z, nylium_x + x, y] += gen_chance
+                            hf_grids[occ, nylium_z + z, nylium_x + x, y] += gen_chance
+    return hf_grids
@@ -0,0 +1,112 @@
+"""
+Local SQLite store of the best dispenser layouts found by the Playerless Core Tools optimiser,
+so re-optimising a configuration it's seen before can pick up where the last run left off.\n
+Results are keyed by a hash of only the PlayerlessCore inputs that affect the optimum, so e.g.
+changing the run time, engine or optimiser still finds them.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+
+APP_NAME = "Stemlight"
+STORE_FILE_NAME = "optimisation_results.sqlite3"
+NULL_TIME = 0
+
+def user_data_dir() -> str:
+    """Get the per-user directory to keep the program's data in, for whichever OS this is"""
+    if sys.platform == "win32":
+        base_path = os.environ.get("APPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base_path = os.path.expanduser("~/Library/Application Support")
+    else:
+        base_path = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    return os.path.join(base_path, APP_NAME)
+
+def config_key(L: PlayerlessCore) -> str:
+    """
+    Hash of the inputs that change which layout's optimal: the platform, dispensers (only whether
+    any are cleared, not where they are), cycles, bone meal limit and objective
+    """
+    config = {
+        "num_disps": L.num_disps,
+        "has_cleared": any(d.cleared == CLEARED for d in L.disp_coords),
+        "size": [L.size.length, L.size.width],
+        "nylium_type": L.nylium_type,
+        "cycles": L.cycles,
+        "blocked_blocks": sorted([row, col] for row, col in set(map(tuple, L.blocked_blocks))),
+        "wb_per_fungus": float(L.wb_per_fungus),
+        "objective": L.objective
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+class ResultStore:
+    """
+    Every optimisation run's best layout, energy, iterations and time taken, by config_key.\n
+    Connections aren't shared, so a store can be used from whichever thread's optimising.
+    """
+    def __init__(self, path: str = None):
+        if path is None:
+            os.makedirs(user_data_dir(), exist_ok=True)
+            path = os.path.join(user_data_dir(), STORE_FILE_NAME)
+        self.path = path
+        with self.connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "config_key TEXT NOT NULL, layout TEXT NOT NULL, energy REAL NOT NULL, "
+                "iterations INTEGER NOT NULL, time_taken REAL NOT NULL, optimiser TEXT NOT NULL, "
+                "recorded REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_config ON results (config_key, energy)"
+            )
+
+    @contextmanager
+    def connect(self):
+        """Open a connection that commits (or rolls back) and closes once done with"""
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def lookup(self, L: PlayerlessCore) -> StoredOptimum | None:
+        """Get the best layout recorded for L's configuration, or None if there isn't one"""
+        key = config_key(L)
+        with self.connect() as connection:
+            best = connection.execute(
+                "SELECT layout, energy, iterations FROM results WHERE config_key = ? "
+                "ORDER BY energy DESC LIMIT 1", (key,)
+            ).fetchone()
+            if best is None:
+                return None
+            total_time, num_runs = connection.execute(
+                "SELECT SUM(time_taken), COUNT(*) FROM results WHERE config_key = ?", (key,)
+            ).fetchone()
+        layout, energy, iterations = best
+        return StoredOptimum(
+            disp_coords=[Dispenser(row, col, NULL_TIME, cleared)
+                         for row, col, cleared in json.loads(layout)],
+            energy=energy,
+            iterations=iterations,
+            total_time=total_time,
+            num_runs=num_runs
+        )
+
+    def record(self, L: PlayerlessCore, disp_coords: List[Dispenser], energy: float,
+               iterations: int, time_taken: float):
+        """Record the best layout an optimisation run on L's configuration found"""
+        layout = json.dumps([[int(d.row), int(d.col), int(d.cleared)] for d in disp_coords])
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (config_key(L), layout, float(energy), int(iterations), float(time_taken),
+                 L.optimiser, time.time())
+            )
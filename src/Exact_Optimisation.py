@@ -0,0 +1,253 @@
+"""
+Exact branch and bound search for the optimal distribution of dispensers on small nylium platforms,
+giving guaranteed optimal layouts for common builds and a ground truth to measure annealing against.
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import fast_calc_fung_dist, compile_blocked_mask, \
+    disp_coords_to_array, platform_symmetries, IncrementalFungDist
+
+NULL_TIME = 0
+# Nodes searched between picking up better solutions found by the other worker processes
+SYNC_INTERVAL = 64
+# Relative slack given to the upper bounds so floating point rounding can never prune the optimum
+BOUND_TOLERANCE = 1e-9
+
+# The search of each worker process and the best energy found by any of them
+worker_search = None
+shared_best = None
+
+def exact_optimisation(
+    L: PlayerlessCore,
+    workers: int = None,
+    incumbent: List[Dispenser] = None
+) -> Tuple[List[Dispenser], float, int]:
+    """
+    Find the layout of L.num_disps dispensers (including their firing order and cleared status)
+    that produces the most desired fungi within the bone meal limit, guaranteed.\n
+    Every placement and firing order is enumerated, other than rotations and reflections of ones
+    already covered, while pruning any partial layout that can't beat the best found so far.
+    Only practical for small platforms, e.g. up to 5x5 with 6 dispensers.\n
+    The search is split by the first dispenser's position across a pool of 'workers' processes
+    (default is one per CPU core). A known good 'incumbent' layout, e.g. from start_optimisation,
+    lets it prune more from the start.\n
+    Returns the optimal layout, its desired fungi, and how many partial layouts were searched.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if L.num_disps == 0:
+        return [], 0, 0
+    has_cleared = CLEARED in [d.cleared for d in L.disp_coords]
+    search = BranchAndBound(L, has_cleared)
+    if incumbent is not None:
+        search.evaluate_layout(disp_coords_to_array(incumbent))
+    start_time = time.time()
+
+    roots = search.root_branches()
+    if workers > 1:
+        context = multiprocessing.get_context("spawn")
+        best = context.Value("d", search.best_energy)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_worker,
+                                 initargs=(L, has_cleared, best)) as executor:
+            results = list(executor.map(search_branch, roots))
+    else:
+        results = [search.search(root) for root in roots]
+    results.append((search.best_layout_energy, search.best_layout, 0))
+
+    nodes = sum(result[2] for result in results)
+    best_energy, best_layout, _ = max([result for result in results if result[1] is not None],
+                                      key=lambda result: result[0], default=(0, None, 0))
+    print("Time taken to search exactly:", round(time.time() - start_time, 3), "seconds")
+    print("Partial layouts searched:", nodes)
+    if best_layout is None:
+        return [Dispenser(-1, -1, NULL_TIME, UNCLEARED) for _ in range(L.num_disps)], 0, nodes
+    best_layout = [Dispenser(row, col, NULL_TIME, cleared)
+                   for row, col, cleared in best_layout.tolist()]
+    return best_layout, best_energy, nodes
+
+def init_worker(L: PlayerlessCore, has_cleared: ClearedStatus, best: Any):
+    """Set up the search of a worker process, sharing the best energy found between them all"""
+    global worker_search, shared_best
+    worker_search = BranchAndBound(L, has_cleared)
+    shared_best = best
+
+def search_branch(root: Tuple[int, int]) -> Tuple[float, np.ndarray, int]:
+    """Search all layouts starting with the given first dispenser in a worker process"""
+    return worker_search.search(root)
+
+class BranchAndBound:
+    """
+    Depth first search over layouts, placing one dispenser at a time in firing order.\n
+    After placing each dispenser, the first cycle's grids are exactly known up to that point, as
+    later dispensers fire after it. Foliage only ever increases within a cycle, so the most desired
+    fungi a dispenser could still add is its selection chances over the currently empty blocks,
+    times the chance its own block is still empty (except on its own block, which it always
+    reaches). Adding this for the best remaining blocks, and for every dispenser in the later
+    cycles, to the desired fungi so far bounds the desired fungi of any completion of the layout.\n
+    Layouts are only searched if they're the lexicographically smallest of all their rotations and
+    reflections that leave the blocked blocks in place.
+    """
+    def __init__(self, L: PlayerlessCore, has_cleared: ClearedStatus):
+        length, width = L.size.length, L.size.width
+        self.num_disps = L.num_disps
+        self.cycles = L.cycles
+        self.width = width
+        self.cleared_states = (UNCLEARED, CLEARED) if has_cleared else (UNCLEARED,)
+        self.bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+        blocked_mask = compile_blocked_mask(length, width, L.blocked_blocks)
+        # Reuse the exact firing maths (and stamps) of the incremental engine
+        self.evaluator = IncrementalFungDist(length, width, L.nylium_type, L.cycles, blocked_mask)
+        self.num_grids = self.evaluator.num_grids
+        self.fungi_grid = 1 if L.nylium_type == WARPED else 0
+        self.fungi_weight = 1 if L.nylium_type == WARPED else 1 / 9
+        self.open_blocks = np.flatnonzero(~blocked_mask.ravel())
+        # Each block can't hold more than a whole desired fungus' worth of foliage
+        self.max_fungi = len(self.open_blocks) * (WARP_FUNG_CHANCE if L.nylium_type == WARPED
+                                                  else 1 / 9)
+
+        # Selection chance of every block (columns) from a dispenser on each block (rows)
+        self.stamps = {}
+        self.sel_matrix = np.zeros((length * width, length * width))
+        for block in self.open_blocks.tolist():
+            row, col = divmod(block, width)
+            stamp, = self.evaluator.get_stamps(np.array([[row, col, UNCLEARED]]))
+            sel_grid = np.zeros((length, width))
+            sel_grid[stamp[2]] = stamp[3]
+            self.sel_matrix[block] = sel_grid.ravel()
+            self.stamps[block] = stamp
+        if L.nylium_type == WARPED:
+            self.sel_matrix *= WARP_FUNG_CHANCE
+        # A dispenser's own block isn't also multiplied by the chance the dispenser's empty
+        self.centre_sel = np.diag(self.sel_matrix).copy()
+        # Clearing resets blocks between cycles, so then only the empty platform bound holds
+        self.empty_gains = self.sel_matrix.sum(axis=1)
+
+        # Symmetries that leave the blocked blocks where they are, as block to block maps
+        rows, cols = np.divmod(np.arange(length * width), width)
+        blocked = set(np.flatnonzero(blocked_mask.ravel()).tolist())
+        self.symmetries = []
+        for transform in platform_symmetries(length, width)[1:]:
+            block_map = np.ravel_multi_index(transform(rows, cols), (length, width))
+            if set(block_map[list(blocked)].tolist()) == blocked:
+                self.symmetries.append(block_map.tolist())
+
+        # Best energy any search has found so far, to prune against
+        self.best_energy = 0.0
+        # Best layout this search has found and its energy
+        self.best_layout = None
+        self.best_layout_energy = 0.0
+        self.nodes = 0
+
+    def root_branches(self) -> List[Tuple[int, int]]:
+        """Every (block, cleared status) of the first dispenser that isn't symmetric to another"""
+        roots = [(block, cleared) for block in self.open_blocks.tolist()
+                 if all(block_map[block] >= block for block_map in self.symmetries)
+                 for cleared in self.cleared_states]
+        # Try the most promising first dispensers first to find good incumbents early
+        roots.sort(key=lambda root: self.empty_gains[root[0]], reverse=True)
+        return roots
+
+    def search(self, root: Tuple[int, int]) -> Tuple[float, np.ndarray, int]:
+        """Search all layouts starting with the given first dispenser, returning the best energy
+        and layout found (if better than the incumbent), and how many partial layouts it took"""
+        self.nodes = 0
+        best_layout = self.best_layout
+        block, cleared = root
+        grids = np.zeros((self.num_grids, *self.evaluator.blocked_mask.shape))
+        bm_for_prod = self.evaluator.fire([self.stamps[block]], grids, 0.0)
+        active = [block_map for block_map in self.symmetries if block_map[block] == block]
+        self.branch([(block, cleared)], grids, bm_for_prod, active)
+        if self.best_layout is best_layout:
+            return 0.0, None, self.nodes
+        return self.best_layout_energy, self.best_layout, self.nodes
+
+    def branch(self, layout, grids, bm_for_prod, active):
+        """Search all completions of a partial layout of (block, cleared status) pairs, given the
+        first cycle's grids after it fired and the symmetries that still leave it unchanged"""
+        self.nodes += 1
+        if self.nodes % SYNC_INTERVAL == 0 and shared_best is not None:
+            self.best_energy = max(self.best_energy, shared_best.value)
+        depth = len(layout)
+        if depth == self.num_disps:
+            self.evaluate_layout(self.to_array(layout), grids, bm_for_prod)
+            return
+
+        empty = 1 - grids[0].ravel()
+        gains = empty * (self.sel_matrix @ empty + (1 - empty) * self.centre_sel)
+        placed = [block for block, _ in layout]
+        free = np.setdiff1d(self.open_blocks, placed, assume_unique=True)
+        order = free[np.argsort(-gains[free], kind="stable")]
+        remaining = self.num_disps - depth
+        next_gains = np.sum(gains[order[:remaining]])
+        later_gains = self.empty_gains if len(self.cleared_states) > 1 else gains
+        later_gains = np.sum(later_gains[placed]) + np.sum(later_gains[order[:remaining]])
+        bound = self.fungi_weight * (np.sum(grids[self.fungi_grid]) + next_gains
+                                     + (self.cycles - 1) * later_gains)
+        if min(bound, self.max_fungi) * (1 + BOUND_TOLERANCE) <= self.best_energy:
+            return
+
+        for block in order.tolist():
+            # Symmetry breaking, only continuing the smallest of all equivalent layouts
+            if any(block_map[block] < block for block_map in active):
+                continue
+            next_active = [block_map for block_map in active if block_map[block] == block]
+            # Clearing only happens at the end of each cycle, so both share the same firing
+            next_grids = grids.copy()
+            next_bm = self.evaluator.fire([self.stamps[block]], next_grids, bm_for_prod)
+            for cleared in self.cleared_states:
+                self.branch(layout + [(block, cleared)], next_grids, next_bm, next_active)
+
+    def evaluate_layout(self, disp_coords, grids=None, bm_for_prod=0.0):
+        """Finish simulating a full layout from its first cycle's grids (or from scratch if not
+        given) and make it the best layout if it's better and within the bone meal limit"""
+        blocks = (disp_coords[:, 0] * self.width + disp_coords[:, 1]).tolist()
+        stamps = [self.stamps[block] for block in blocks]
+        cleared = disp_coords[:, 2] == CLEARED
+        cleared_rows, cleared_cols = disp_coords[cleared, 0], disp_coords[cleared, 1]
+        if grids is None:
+            grids = np.zeros((self.num_grids, *self.evaluator.blocked_mask.shape))
+            bm_for_prod = self.evaluator.fire(stamps, grids, bm_for_prod)
+        else:
+            grids = grids.copy()
+        for cycle in range(self.cycles):
+            if cycle > 0:
+                bm_for_prod = self.evaluator.fire(stamps, grids, bm_for_prod)
+            grids[:, cleared_rows, cleared_cols] = 0
+
+        energy, bm_for_prod = self.evaluator.totals(grids, bm_for_prod)
+        if energy > self.best_energy and bm_for_prod < self.bm_limit:
+            self.best_energy = self.best_layout_energy = float(energy)
+            self.best_layout = disp_coords
+            if shared_best is not None:
+                with shared_best.get_lock():
+                    shared_best.value = max(shared_best.value, self.best_energy)
+
+    def to_array(self, layout) -> np.ndarray:
+        """Convert a layout of (block, cleared status) pairs to an (n, 3) array"""
+        return np.array([(*divmod(block, self.width), cleared) for block, cleared in layout])
+
+######################################
+# Research and development functions #
+######################################
+def compare_annealing_to_exact(L: PlayerlessCore, run_times=(1, 2, 5), workers=1):
+    """Print how close simulated annealing gets to the exact optimum for different run times"""
+    from src.Stochastic_Optimisation import start_optimisation
+
+    optimal_layout, optimal_energy, _ = exact_optimisation(L, workers)
+    print("Exact optimum:", optimal_energy, optimal_layout)
+    for run_time in run_times:
+        L.run_time = run_time
+        _, energy, _ = start_optimisation(L, workers)
+        gap = 100 * (optimal_energy - energy) / optimal_energy if optimal_energy > 0 else 0
+        print(f"Annealing for {run_time}s: {energy} ({gap:.3f}% below optimal)")
+    # Sanity check the exact optimum against the main engine
+    print("Engine check:", fast_calc_fung_dist(L.size.length, L.size.width, L.nylium_type,
+                                               optimal_layout, L.cycles, L.blocked_blocks)[0])
@@ -1,13 +1,27 @@
 """A program that helps calculate the optimal position to place n dispensers on a custom size grid of nylium"""
 
+import io
+import os
+import glob
 import time
 import itertools
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
 
 from src.Assets.constants import *
 from src.Assets.heatmap_data import heatmap_array_xyz
 from src.Assets.data_classes import *
+from src.Assets.helpers import resource_path
+from src.Assets import instrumentation
+from src.Assets.instrumentation import instrument, count
+from src.Fast_Dispenser_Distribution import compile_disp_stamps, calc_huge_fungus_grids, \
+    fast_calc_fung_dist, get_engine_backend, ENGINE_BACKENDS, disp_coords_to_array, \
+    batch_calc_fung_dist, IncrementalFungDist, platform_symmetries
+from src.Stochastic_Optimisation import start_optimisation
 
 DP_VAL = 5
 NULL_TIME = 0
@@ -16,135 +30,277 @@ MAX_ALL_LENGTH = 10
 MAX_ALL_CYCLES = 5
 ALL_RUN_TIME = 10
 MAX_ALL_AVG_NUM_DISPS = 15
+# Maximum number of layouts the distribution cache remembers before forgetting the oldest
+DIST_CACHE_SIZE = 32
 
-def selection_chance(x1, y1):
-    """Calculates the probability of a block being selected for 
-    foliage generation given its offset from a dispenser"""
-    x1 = np.abs(x1).astype(int)
-    y1 = np.abs(y1).astype(int)
-    # Need to take min of x1 and y1 to avoid index out of bounds as numpy evaluates both branches
-    return np.where((x1 > 2) | (y1 > 2), 0, NETHER_FOLIAGE_SEL_CACHE[np.minimum(x1, 2),
-                                                                     np.minimum(y1, 2)])
-
-def calculate_distribution(L: PlayerlessCore) -> PlayerlessCoreDistOutput:
-    """Calculates the distribution of foliage and fungi on a custom size grid of nylium"""
+ALT_PLACEMENTS_PATH = "Alternate Dispenser Placements.txt"
+# Relative difference in desired fungi from the optimal an alternate placement can have
+ALT_TOLERANCE = 0.001
+# Most dispensers every firing order is searched for, any more and orders are sampled
+MAX_ALT_SEARCH_DISPS = 8
+# Random firing orders tried for each placement with more than MAX_ALT_SEARCH_DISPS dispensers
+ALT_SAMPLES = 4096
+# Sampled firing orders evaluated at once by the batched engine
+ALT_BATCH_SIZE = 256
+# Fewest dispensers the alternate placement search is worth spreading over processes for
+MIN_ALT_PARALLEL_DISPS = 7
+# Wart blocks/fungus (the slider's default) the layout atlas' optimal layouts are found for
+ALL_WB_PER_FUNGUS = 120
+
+# Optimal layouts of every standard configuration, see build_layout_atlas
+ATLAS_PATH = "src/Assets/layout_atlas.bin"
+ATLAS_MAGIC = b"STLATLAS"
+ATLAS_VERSION = 1
+ATLAS_HEADER = np.dtype([("magic", "S8"), ("version", "<u2"), ("max_length", "u1"),
+                         ("max_width", "u1"), ("max_cycles", "u1"), ("max_disps", "u1"),
+                         ("wb_per_fungus", "<f4")])
+# Fixed size records, so any configuration's can be read straight from its offset in the file.
+# Configurations without an optimal layout (yet) have 0 desired fungi
+ATLAS_RECORD = np.dtype([("fungi", "<f4"), ("bone_meal", "<f4"),
+                         ("layout", "u1", (MAX_ALL_AVG_NUM_DISPS, 2))])
+ATLAS_NYLIUM_TYPES = (WARPED, CRIMSON)
+ATLAS_SHAPE = (len(ATLAS_NYLIUM_TYPES), MAX_ALL_LENGTH, MAX_ALL_WIDTH, MAX_ALL_CYCLES,
+               MAX_ALL_AVG_NUM_DISPS)
+# Layout atlas loaded by lookup_layout_atlas, False if there isn't a valid one
+layout_atlas = None
+
+@instrument()
+def calculate_distribution(L: PlayerlessCore, windowed=True, dtype=np.float64,
+                           breakdown=False) -> PlayerlessCoreDistOutput:
+    """Calculates the distribution of foliage and fungi on a custom size grid of nylium.\n
+    Always full precision by default as this feeds the final results, unlike L.engine_dtype.
+    Only the totals are calculated unless 'breakdown' is set, see DistBreakdown"""
     fungi_weight = WARP_FUNG_CHANCE if L.nylium_type == WARPED else CRMS_FUNG_CHANCE
-    sprouts_grid = np.zeros((L.size.length, L.size.width))
-    twisting_grid = np.zeros((L.size.length, L.size.width))
-    # 4D array for storing distribution of foliage for all dispensers and cycles
-    disp_foliage_grids = np.zeros((L.num_disps, L.cycles, L.size.length, L.size.width))
+    sprouts_grid = np.zeros((L.size.length, L.size.width), dtype)
+    twisting_grid = np.zeros((L.size.length, L.size.width), dtype)
     # 2D array for storing distribution of all the foliage
-    total_foliage_grid = np.zeros((L.size.length, L.size.width))
-
-    # 4D array for storing distribution of desired fungus for all dispensers and cycles
-    disp_des_fungi_grids = np.zeros((L.num_disps, L.cycles, L.size.length, L.size.width))
+    total_foliage_grid = np.zeros((L.size.length, L.size.width), dtype)
     # 2D array for storing distribution of desired fungus
-    total_des_fungi_grid = np.zeros((L.size.length, L.size.width))
-    row, col = np.ogrid[:L.size.length, :L.size.width]
+    total_des_fungi_grid = np.zeros((L.size.length, L.size.width), dtype)
+    stamps, cleared_rows, cleared_cols = compile_disp_stamps(L.size.length, L.size.width,
+                                                             L.disp_coords, L.blocked_blocks,
+                                                             windowed, dtype)
+    if instrumentation.ENABLED:
+        # Every firing touches its window, and for warped nylium the whole platform too
+        count("cells touched", L.cycles * sum(stamp[3].size if L.nylium_type != WARPED
+                                              else stamp[3].size + L.size.length * L.size.width
+                                              for stamp in stamps))
+    if breakdown:
+        breakdown = DistBreakdown(L.size.length, L.size.width, L.nylium_type, L.cycles, stamps,
+                                  cleared_rows, cleared_cols, dtype)
 
     # 'bm_for_prod': bone meal used during 1 cycle of firing all the given dispensers
     bm_for_prod = 0.0
     for cycle in range(L.cycles):
         for disp_n in range(L.num_disps):
-            foliage_chance, bm_for_prod = generate_foliage(L.disp_coords, total_foliage_grid,
-                                                           bm_for_prod, disp_n, row, col)
-            for row_b, col_b in L.blocked_blocks:
-                foliage_chance[row_b][col_b] = 0
+            window, foliage_chance, bm_for_prod = generate_foliage(stamps[disp_n],
+                                                                   total_foliage_grid, bm_for_prod)
+            # Only the window around the dispenser can change, so just work on views of it
+            total_foliage_window = total_foliage_grid[window]
 
             des_fungi_chance = foliage_chance * fungi_weight
-            disp_des_fungi_grids[disp_n][cycle] = (1 - total_foliage_grid) * des_fungi_chance
-            total_des_fungi_grid += disp_des_fungi_grids[disp_n][cycle]
+            disp_des_fungi_window = (1 - total_foliage_window) * des_fungi_chance
+            total_des_fungi_grid[window] += disp_des_fungi_window
             
-            disp_foliage_grids[disp_n][cycle] = (1 - total_foliage_grid) * foliage_chance
-            total_foliage_grid += disp_foliage_grids[disp_n][cycle]
+            disp_foliage_window = (1 - total_foliage_window) * foliage_chance
+            total_foliage_window += disp_foliage_window
+            sprouts_chance = new_disp_chance = None
             
             # If warped nylium, generate sprouts and twisting vines
             if L.nylium_type == WARPED:
-                sprouts_chance = (1 - total_foliage_grid) * foliage_chance
-                disp_foliage_grids[disp_n][cycle] += sprouts_chance
-                total_foliage_grid += sprouts_chance
-                sprouts_grid += sprouts_chance
+                sprouts_chance = (1 - total_foliage_window) * foliage_chance
+                total_foliage_window += sprouts_chance
+                sprouts_grid[window] += sprouts_chance
                 
                 # Math for this was kinda fun actually
-                disp_row, disp_col = L.disp_coords[disp_n].row, L.disp_coords[disp_n].col
+                # Twisting vines can land anywhere on the platform, not just in the window
+                disp_row, disp_col, _, _, centre = stamps[disp_n]
                 new_disp_chance = 1 - total_foliage_grid[disp_row, disp_col]
-                twisting_chance = (1 - total_foliage_grid) * TWISTING_SEL_CHANCE \
-                                  * np.where((row == disp_row) & (col == disp_col),
-                                             1, new_disp_chance)
-                disp_foliage_grids[disp_n][cycle] += twisting_chance
+                twisting_chance = (1 - total_foliage_grid) * TWISTING_SEL_CHANCE * new_disp_chance
+                twisting_window = twisting_chance[window]
+                twisting_window[centre] = (1 - total_foliage_window[centre]) * TWISTING_SEL_CHANCE
                 total_foliage_grid += twisting_chance
                 twisting_grid += twisting_chance
+
+            if breakdown:
+                breakdown.record(cycle, disp_n, disp_foliage_window, disp_des_fungi_window,
+                                 sprouts_chance, new_disp_chance)
         
         # Replicate triggering pistons to clear foliage on top of selected dispensers
-        for disp in L.disp_coords:
-            # Clear foliage only on top of cleared dispensers
-            if disp.cleared == CLEARED:
-                disp_row, disp_col = disp.row, disp.col
-                total_foliage_grid[disp_row, disp_col] = 0
-                total_des_fungi_grid[disp_row, disp_col] = 0
-                disp_foliage_grids[:, :, disp_row, disp_col] = 0
-                disp_des_fungi_grids[:, :, disp_row, disp_col] = 0
-                if L.nylium_type == WARPED:
-                    sprouts_grid[disp_row, disp_col] = 0
-                    twisting_grid[disp_row, disp_col] = 0
+        total_foliage_grid[cleared_rows, cleared_cols] = 0
+        total_des_fungi_grid[cleared_rows, cleared_cols] = 0
+        sprouts_grid[cleared_rows, cleared_cols] = 0
+        twisting_grid[cleared_rows, cleared_cols] = 0
     
     return PlayerlessCoreDistOutput(
         total_foliage_grid=total_foliage_grid,
         total_des_fungi_grid=total_des_fungi_grid,
-        disp_foliage_grids=disp_foliage_grids,
-        disp_des_fungi_grids=disp_des_fungi_grids,
         sprouts_grid=sprouts_grid,
         twisting_grid=twisting_grid,
-        bm_for_prod=bm_for_prod
+        bm_for_prod=bm_for_prod,
+        breakdown=breakdown or None
     )
 
-def generate_foliage(disp_coords, foliage_grid, bm_for_prod, disp_n, row,
-                     col) -> Tuple[np.ndarray, float]:
-    """Generates the distribution of foliage around a dispenser at a given position"""
-    disp_row, disp_col = disp_coords[disp_n].row, disp_coords[disp_n].col
+def generate_foliage(stamp, foliage_grid, bm_for_prod) -> Tuple[Tuple[slice, slice], np.ndarray,
+                                                                  float]:
+    """Generates the distribution of foliage in the window around a dispenser at a given position,
+    using its precompiled stamp from compile_disp_stamps"""
+    disp_row, disp_col, window, sel_chance, centre = stamp
     disp_bm_chance = 1 - foliage_grid[disp_row, disp_col]
     bm_for_prod += disp_bm_chance
 
     # P(foliage at row, col) = P(Air above dispensers) * P(row, col being selected)
     # Note, don't double multiply the chance of air above the position if it's at the dispenser
-    foliage_chance = np.where((row == disp_row) & (col == disp_col), 1, disp_bm_chance) \
-                     * selection_chance(row - disp_row, col - disp_col)
-    return foliage_chance, bm_for_prod
+    foliage_chance = np.where(centre, 1, disp_bm_chance) * sel_chance
+    return window, foliage_chance, bm_for_prod
+
+class DistBreakdown:
+    """
+    How much of the foliage and desired fungi calculate_distribution found came from each firing
+    of each dispenser, without keeping a (num_disps, cycles, length, width) grid of each.\n
+    Each firing only keeps its foliage, desired fungi and sprouts in its dispenser's window and
+    the chance of air above the dispenser after it, as that's all the twisting vines it spreads
+    over the whole platform depend on besides the foliage already there. Breakdowns of a block or
+    a dispenser are rebuilt from them on demand, replaying just what's needed with the same maths
+    so they match the full grids exactly, and like them they're zeroed on cleared blocks.
+    """
+    def __init__(self, length, width, nylium_type, cycles, stamps, cleared_rows, cleared_cols,
+                 dtype=np.float64):
+        self.length = length
+        self.width = width
+        self.nylium_type = nylium_type
+        self.cycles = cycles
+        self.stamps = stamps
+        self.cleared_mask = np.zeros((length, width), dtype=bool)
+        self.cleared_mask[cleared_rows, cleared_cols] = True
+        self.dtype = dtype
+        # Windows of each firing, indexed by [cycle][dispenser]
+        self.foliage_windows = [[None] * len(stamps) for _ in range(cycles)]
+        self.des_fungi_windows = [[None] * len(stamps) for _ in range(cycles)]
+        self.sprouts_windows = [[None] * len(stamps) for _ in range(cycles)]
+        self.new_disp_chances = np.zeros((cycles, len(stamps)), dtype)
+
+    def record(self, cycle, disp_n, foliage_window, des_fungi_window, sprouts_window=None,
+               new_disp_chance=None):
+        """Keep a firing's foliage (not including sprouts), desired fungi and, for warped nylium,
+        sprouts in its window and chance of air above its dispenser after it"""
+        self.foliage_windows[cycle][disp_n] = foliage_window
+        self.des_fungi_windows[cycle][disp_n] = des_fungi_window
+        if self.nylium_type == WARPED:
+            self.sprouts_windows[cycle][disp_n] = sprouts_window
+            self.new_disp_chances[cycle, disp_n] = new_disp_chance
+
+    def block(self, row, col) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (num_disps, cycles) arrays of the foliage and desired fungi each firing of each
+        dispenser left at a block, by replaying the foliage there"""
+        foliage = np.zeros((len(self.stamps), self.cycles), self.dtype)
+        des_fungi = np.zeros((len(self.stamps), self.cycles), self.dtype)
+        if self.cleared_mask[row, col]:
+            return foliage, des_fungi
+
+        total_foliage = np.dtype(self.dtype).type(0)
+        for cycle in range(self.cycles):
+            for disp_n, (disp_row, disp_col, window, _, _) in enumerate(self.stamps):
+                rows, cols = window
+                if rows.start <= row < rows.stop and cols.start <= col < cols.stop:
+                    idx = (row - rows.start, col - cols.start)
+                    foliage[disp_n, cycle] = self.foliage_windows[cycle][disp_n][idx]
+                    des_fungi[disp_n, cycle] = self.des_fungi_windows[cycle][disp_n][idx]
+                    total_foliage += foliage[disp_n, cycle]
+                    if self.nylium_type == WARPED:
+                        sprouts_chance = self.sprouts_windows[cycle][disp_n][idx]
+                        foliage[disp_n, cycle] += sprouts_chance
+                        total_foliage += sprouts_chance
+
+                if self.nylium_type == WARPED:
+                    twisting_chance = (1 - total_foliage) * TWISTING_SEL_CHANCE
+                    if (row, col) != (disp_row, disp_col):
+                        twisting_chance *= self.new_disp_chances[cycle, disp_n]
+                    foliage[disp_n, cycle] += twisting_chance
+                    total_foliage += twisting_chance
+        return foliage, des_fungi
+
+    def disp_des_fungi_grids(self, disp_n) -> np.ndarray:
+        """Get a (cycles, length, width) array of the desired fungi each firing of a dispenser
+        left on the platform"""
+        des_fungi_grids = np.zeros((self.cycles, self.length, self.width), self.dtype)
+        window = self.stamps[disp_n][2]
+        for cycle in range(self.cycles):
+            des_fungi_grids[cycle][window] = self.des_fungi_windows[cycle][disp_n]
+        des_fungi_grids[:, self.cleared_mask] = 0
+        return des_fungi_grids
+
+    def disp_foliage_grids(self, disp_n) -> np.ndarray:
+        """Get a (cycles, length, width) array of the foliage each firing of a dispenser left on
+        the platform, replaying the foliage over the whole platform for warped nylium's twisting
+        vines"""
+        foliage_grids = np.zeros((self.cycles, self.length, self.width), self.dtype)
+        window = self.stamps[disp_n][2]
+        for cycle in range(self.cycles):
+            foliage_grids[cycle][window] = self.foliage_windows[cycle][disp_n]
+        if self.nylium_type != WARPED:
+            foliage_grids[:, self.cleared_mask] = 0
+            return foliage_grids
+
+        total_foliage_grid = np.zeros((self.length, self.width), self.dtype)
+        for cycle in range(self.cycles):
+            for disp_n1, (_, _, window, _, centre) in enumerate(self.stamps):
+                total_foliage_window = total_foliage_grid[window]
+                total_foliage_window += self.foliage_windows[cycle][disp_n1]
+                total_foliage_window += self.sprouts_windows[cycle][disp_n1]
+
+                twisting_chance = (1 - total_foliage_grid) * TWISTING_SEL_CHANCE \
+                                  * self.new_disp_chances[cycle, disp_n1]
+                twisting_window = twisting_chance[window]
+                twisting_window[centre] = (1 - total_foliage_window[centre]) * TWISTING_SEL_CHANCE
+                total_foliage_grid += twisting_chance
+                if disp_n1 == disp_n:
+                    foliage_grids[cycle][window] += self.sprouts_windows[cycle][disp_n]
+                    foliage_grids[cycle] += twisting_chance
+            total_foliage_grid[self.cleared_mask] = 0
+        foliage_grids[:, self.cleared_mask] = 0
+        return foliage_grids
 
 def get_totals(D: PlayerlessCoreDistOutput) -> Tuple[float, float, float]:
     """Calculates the total amount of foliage, fungi and bone meal required to grow the fungi"""
     total_fungi = np.sum(D.total_des_fungi_grid)
     # Total foliage EXCLUDES desired fungi and sprouts, and 2 / 3 of twisting vines don't drop
-    print(f"total_foliage: {np.sum(D.total_foliage_grid)}")
-    print(f"twisting: {np.sum(D.twisting_grid)}")
     total_foliage = np.sum(D.total_foliage_grid - D.sprouts_grid
                            - 2 * D.twisting_grid / 3) - total_fungi
-    print(f"new total_foliage: {total_foliage}")
     bm_for_grow = AVG_BM_TO_GROW_FUNG * total_fungi
 
     return total_fungi, total_foliage, bm_for_grow
 
-def calculate_fungus_distribution(L: PlayerlessCore) -> PlayerlessCoreOutput:
-    """Calculates the distribution of foliage and fungi on a custom size grid of nylium"""
+def calculate_fungus_distribution(L: PlayerlessCore, breakdown=False) -> PlayerlessCoreOutput:
+    """Calculates the distribution of foliage and fungi on a custom size grid of nylium,
+    along with its DistBreakdown if 'breakdown' is set.\n
+    Results are memoised in dist_cache and shared between callers, so don't modify them"""
     L.disp_coords.sort(key=lambda d: d.timestamp)
+    key = layout_fingerprint(L)
+    dist_data = dist_cache.get(key, lambda cached: cached.breakdown is not None or not breakdown)
+    if dist_data is not None:
+        return dist_data
 
-    out = calculate_distribution(L)
+    out = calculate_distribution(L, breakdown=breakdown)
     # Total foliage EXCLUDES desired fungi and sprouts
     total_des_fungi, total_foliage, bm_for_grow = get_totals(out)
 
     # Subtract the bit of bone meal retrieved from composting the excess foliage at 82.5% efficiency
     bm_from_compost = (FOLIAGE_COLLECTION_EFFIC * total_foliage) / FOLIAGE_PER_BM
     
-    return PlayerlessCoreOutput(
+    dist_data = PlayerlessCoreOutput(
         total_foliage=total_foliage,
         total_des_fungi=total_des_fungi,
         bm_for_prod=out.bm_for_prod - bm_from_compost,
         bm_for_grow=bm_for_grow,
         bm_total=out.bm_for_prod + bm_for_grow,
-        disp_foliage_grids=out.disp_foliage_grids,
-        disp_des_fungi_grids=out.disp_des_fungi_grids
+        total_des_fungi_grid=out.total_des_fungi_grid,
+        breakdown=out.breakdown
     )
+    dist_cache.put(key, dist_data)
+    return dist_data
 
+@instrument()
 def calc_huge_fungus_distribution(
     L: PlayerlessCore, 
     dist_data: PlayerlessCoreOutput = None
@@ -165,17 +321,437 @@ def calc_huge_fungus_distribution(
     if dist_data is None:
         dist_data = calculate_fungus_distribution(L)
     
-    des_fungi_grid = np.sum(dist_data.disp_des_fungi_grids, axis=(0, 1))
     bm_for_prod = dist_data.bm_for_prod
-    p_width = L.size.width
-    p_length = L.size.length
+    # Wart blocks before the blast chamber's cut, so changing its efficiency reuses them
+    key = (layout_fingerprint(L), L.engine_backend)
+    wart_blocks = dist_cache.get(key)
+    if wart_blocks is None:
+        hf_grids = get_engine_backend(L.engine_backend).calc_huge_fungus_grids(
+            dist_data.total_des_fungi_grid
+        )
+        wart_blocks = np.sum(hf_grids[2])
+        dist_cache.put(key, wart_blocks)
+
+    total_wb = wart_blocks * L.blast_chamber_effic
+    return total_wb, bm_for_prod
+
+def layout_fingerprint(L: PlayerlessCore) -> Tuple:
+    """
+    Immutable fingerprint of everything about a layout its distribution depends on: the platform,
+    dispensers in firing order, cycles and blocked blocks. Leaves out the likes of the blast
+    chamber efficiency, wart blocks/fungus and run time, which don't change it.
+    """
+    return (
+        L.size.length, L.size.width, L.nylium_type, L.cycles, L.num_disps,
+        tuple((d.row, d.col, int(d.cleared))
+              for d in sorted(L.disp_coords, key=lambda d: d.timestamp)),
+        tuple(sorted({(row, col) for row, col in L.blocked_blocks}))
+    )
+
+class DistributionCache:
+    """
+    Bounded LRU cache of the distributions and wart blocks of recently calculated layouts, keyed
+    on their layout_fingerprint, so e.g. selecting a block or changing the blast chamber
+    efficiency reuses the last calculation instead of simulating the layout all over again.
+    """
+    def __init__(self, max_size=DIST_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, usable: Callable = None):
+        """Get the cached result for a key, or None if there isn't one (or 'usable' says it's
+        missing something the caller needs)"""
+        result = self.entries.get(key)
+        if result is None or (usable is not None and not usable(result)):
+            self.misses += 1
+            count("distribution cache misses")
+            return None
+        self.hits += 1
+        count("distribution cache hits")
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        """Cache the result for a key, forgetting the oldest one if the cache is full"""
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> str:
+        """Summary of the cache's hit and miss statistics"""
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups > 0 else 0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
+
+# Distributions shared between everything showing results of the layout being edited
+dist_cache = DistributionCache()
+
+def transform_layout(transform: Callable, layout: np.ndarray) -> np.ndarray:
+    """Apply one of platform_symmetries to an (n, 3) layout array, keeping its firing order"""
+    rows, cols = transform(layout[:, 0], layout[:, 1])
+    return np.column_stack((rows, cols, layout[:, 2]))
+
+@instrument()
+def output_viable_coords(L: PlayerlessCore, optimal_coords, optimal_value, workers: int = None,
+                         seed: int = None) -> int:
+    """Find every reflection, rotation and firing order of the optimal coordinates within
+    ALT_TOLERANCE of the best solution and stream them to a file as they're found.\n
+    Each distinct placement of the dispensers is only searched once, as placements a symmetry of
+    the blocked blocks apart have the same firing orders mapped onto each other. The searches are
+    spread over 'workers' processes (default is one per CPU core) when they're big enough."""
+    start_time = time.time()
+    length, width = L.size.length, L.size.width
+    layout = disp_coords_to_array(optimal_coords)
+    blocked_blocks = {(row, col) for row, col in L.blocked_blocks}
+    transforms = platform_symmetries(length, width)
+    # Symmetries that map the blocked blocks onto themselves
+    stabilisers = [transform for transform in transforms
+                   if {transform(row, col) for row, col in blocked_blocks} == blocked_blocks]
+
+    # Placements to search, and every distinct placement as (search, symmetry mapping onto it)
+    searches, placements, seen = [], [], set()
+    for transform in transforms:
+        placement = transform_layout(transform, layout)
+        key = frozenset(map(tuple, placement.tolist()))
+        if key in seen or any((row, col) in blocked_blocks for row, col, _ in key):
+            continue
+        seen.add(key)
+        for search_n, searched in enumerate(searches):
+            stabiliser = next((stabiliser for stabiliser in stabilisers if key == frozenset(
+                map(tuple, transform_layout(stabiliser, searched).tolist()))), None)
+            if stabiliser is not None:
+                placements.append((search_n, stabiliser))
+                break
+        else:
+            placements.append((len(searches), transforms[0]))
+            searches.append(placement)
+
+    # Split the searches up by which dispenser fires first, so there's more than one to share out
+    # even when every placement's a symmetry of the first
+    tasks = []
+    seeds = np.random.SeedSequence(seed).spawn(len(searches))
+    for search_n, (searched, search_seed) in enumerate(zip(searches, seeds)):
+        if len(layout) > MAX_ALT_SEARCH_DISPS:
+            tasks.append((search_n, sample_firing_orders,
+                          (L, searched, optimal_value, search_seed)))
+        else:
+            tasks += [(search_n, search_firing_orders, (L, searched, optimal_value, [first_disp]))
+                      for first_disp in range(len(layout))]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    num_alt_placements = 0
+    with open(ALT_PLACEMENTS_PATH, "w") as file:
+        def write_search(search_n, survivors, search_worst):
+            nonlocal num_alt_placements
+            for placement_n, stabiliser in placements:
+                if placement_n != search_n:
+                    continue
+                for total_des_fungi, bm_for_prod, order in survivors:
+                    num_alt_placements += 1
+                    write_alt_placement(file, num_alt_placements, L.size, total_des_fungi,
+                                        bm_for_prod, transform_layout(stabiliser, order),
+                                        blocked_blocks)
+            file.flush()
+            return search_worst
+
+        file.write(f"Alternate placements within {ALT_TOLERANCE * 100}% of "
+                   f"{round(optimal_value, 5)} fungi/cycle, in the order they're found:\n\n")
+        worst_value = optimal_value
+        if workers > 1 and len(layout) >= MIN_ALT_PARALLEL_DISPS:
+            # Always spawn rather than fork, as forking a process running Tk isn't safe
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = {executor.submit(search_func, *args): search_n
+                           for search_n, search_func, args in tasks}
+                for future in as_completed(futures):
+                    worst_value = min(worst_value, write_search(futures[future], *future.result()))
+        else:
+            for search_n, search_func, args in tasks:
+                worst_value = min(worst_value, write_search(search_n, *search_func(*args)))
+
+        lost_f = optimal_value - worst_value
+        worst_loss = round(lost_f / optimal_value * 100, 5)
+        lost_f = round(lost_f, 5)
+        file.write(f"Number of alternate placements: {num_alt_placements}\n")
+        file.write(f"Max efficiency loss without caring about order: {worst_loss}% "
+                   f"({lost_f} fungi/cycle)\n")
+        if len(layout) > MAX_ALT_SEARCH_DISPS:
+            file.write(f"Only {ALT_SAMPLES} random firing orders of each placement were tried\n")
+    print("Alternate placements calculated in:", round(time.time() - start_time, 3), "seconds")
+    return num_alt_placements
+
+def search_firing_orders(L: PlayerlessCore, layout: np.ndarray, optimal_value,
+                         first_disps: List[int] = None) -> Tuple[List, float]:
+    """
+    Search every firing order of one placement of the dispensers, or just the ones starting with
+    one of 'first_disps' (in a worker process for output_viable_coords), returning the
+    (desired fungi, bone meal, layout) of each one within ALT_TOLERANCE of the optimal value and
+    the least desired fungi of any within the bone meal limit. Bone meal is worked out the same
+    way as calculate_fungus_distribution, so it matches what the GUI shows for the layout.\n
+    Orders are built up a dispenser at a time with the scalar engine, so each prefix is only fired
+    once, and a prefix is pruned once no order starting with it can be within the tolerance or
+    the worst so far. Desired fungi on blocks that aren't cleared can only grow, by at most the
+    chance the block's still empty and at most the selection chance of every firing left, which
+    bounds the desired fungi of every order starting with a prefix from above and below.
+    """
+    length, width = L.size.length, L.size.width
+    evaluator = IncrementalFungDist(length, width, L.nylium_type, L.cycles, L.blocked_blocks,
+                                    compost_effic=FOLIAGE_COLLECTION_EFFIC)
+    stamps = evaluator.get_stamps(layout)
+    cleared = layout[:, 2] == CLEARED
+    cleared_rows, cleared_cols = layout[cleared, 0], layout[cleared, 1]
+    kept_mask = np.ones((length, width), dtype=bool)
+    kept_mask[cleared_rows, cleared_cols] = False
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+    min_fungi = optimal_value * (1 - ALT_TOLERANCE)
+
+    # Each dispenser's selection chances over the blocks that aren't cleared
+    sel_chances = np.zeros((len(layout), length, width))
+    for sel_chance, (_, _, window, stamp_chance, _) in zip(sel_chances, stamps):
+        sel_chance[window] = stamp_chance
+    sel_chances = sel_chances[:, kept_mask]
+    later_sel_chance = (L.cycles - 1) * np.sum(sel_chances, axis=0)
+    if L.nylium_type == WARPED:
+        fungi_chance = WARP_FUNG_CHANCE
+        get_des_fungi = lambda grids: grids[1][kept_mask]
+    else:
+        fungi_chance = CRMS_FUNG_CHANCE
+        get_des_fungi = lambda grids: grids[0][kept_mask] * CRMS_FUNG_CHANCE
+
+    survivors = []
+    worst_value = optimal_value
+    order = []
+
+    def search(grids, bm_for_prod, remaining, remaining_sel_chance):
+        nonlocal worst_value
+        if not remaining:
+            # Finish the first cycle then fire the rest in the same order
+            ordered_stamps = [stamps[disp_n] for disp_n in order]
+            grids[:, cleared_rows, cleared_cols] = 0
+            for _ in range(L.cycles - 1):
+                bm_for_prod = evaluator.fire(ordered_stamps, grids, bm_for_prod)
+                grids[:, cleared_rows, cleared_cols] = 0
+            total_des_fungi, bm_for_prod = evaluator.totals(grids, bm_for_prod)
 
-    hf_width = NT_MAX_RAD + p_width + NT_MAX_RAD
-    hf_length = NT_MAX_RAD + p_length + NT_MAX_RAD
+            bm_req = bm_for_prod < bm_limit
+            if total_des_fungi < worst_value and bm_req:
+                worst_value = total_des_fungi
+            if abs(total_des_fungi - optimal_value) / optimal_value <= ALT_TOLERANCE and bm_req:
+                survivors.append((total_des_fungi, bm_for_prod, layout[order]))
+            return
+
+        lower_bound = np.sum(get_des_fungi(grids))
+        upper_bound = lower_bound + fungi_chance * np.sum(np.minimum(
+            1 - grids[0][kept_mask], remaining_sel_chance + later_sel_chance))
+        if upper_bound < min_fungi and lower_bound >= worst_value:
+            return
+        for disp_n in remaining:
+            child_grids = grids.copy()
+            child_bm = evaluator.fire(stamps[disp_n:disp_n + 1], child_grids, bm_for_prod)
+            order.append(disp_n)
+            search(child_grids, child_bm, [d for d in remaining if d != disp_n],
+                   remaining_sel_chance - sel_chances[disp_n])
+            order.pop()
+
+    disps = list(range(len(layout)))
+    for first_disp in disps if first_disps is None else first_disps:
+        grids = np.zeros((evaluator.num_grids, length, width))
+        bm_for_prod = evaluator.fire(stamps[first_disp:first_disp + 1], grids, 0.0)
+        order.append(first_disp)
+        search(grids, bm_for_prod, [disp_n for disp_n in disps if disp_n != first_disp],
+               np.sum(sel_chances, axis=0) - sel_chances[first_disp])
+        order.pop()
+    return survivors, worst_value
+
+def sample_firing_orders(L: PlayerlessCore, layout: np.ndarray, optimal_value,
+                         seed: np.random.SeedSequence = None) -> Tuple[List, float]:
+    """Like search_firing_orders, but for placements with too many dispensers to try every order
+    of, so ALT_SAMPLES random orders (and the original one) are tried in batches instead"""
+    rng = np.random.default_rng(seed)
+    num_disps = len(layout)
+    orders = rng.permuted(np.tile(np.arange(num_disps), (ALT_SAMPLES, 1)), axis=1)
+    orders[0] = np.arange(num_disps)
+    orders = np.unique(orders, axis=0)
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+
+    survivors = []
+    worst_value = optimal_value
+    for batch_start in range(0, len(orders), ALT_BATCH_SIZE):
+        batch = layout[orders[batch_start:batch_start + ALT_BATCH_SIZE]]
+        total_des_fungi, bm_for_prod = batch_calc_fung_dist(
+            L.size.length, L.size.width, L.nylium_type, batch, L.cycles, L.blocked_blocks,
+            compost_effic=FOLIAGE_COLLECTION_EFFIC
+        )
+        bm_req = bm_for_prod < bm_limit
+        if np.any(bm_req):
+            worst_value = min(worst_value, np.min(total_des_fungi[bm_req]))
+        viable = bm_req & (np.abs(total_des_fungi - optimal_value) / optimal_value <= ALT_TOLERANCE)
+        survivors.extend(zip(total_des_fungi[viable], bm_for_prod[viable], batch[viable]))
+    return survivors, worst_value
+
+def write_alt_placement(file, n, size: Dimensions, total_des_fungi, bm_for_prod,
+                        placement: np.ndarray, blocked_blocks):
+    """Write an alternate placement's desired fungi, bone meal and firing order to a file"""
+    placement = placement.tolist()
+    coords = [[pos[0], pos[1]] for pos in placement]
+    coords_str = '['
+    for j, (row, col) in enumerate(coords):
+        if [row, col, CLEARED] in placement:
+            coords_str += '{' + str(row) + ', ' + str(col) + '}'
+        else:
+            coords_str += '[' + str(row) + ', ' + str(col) + ']'
+
+        if j != len(coords) - 1:
+            coords_str += ', '
+        else:
+            coords_str += ']'
+
+    file.write(f"#{n}:\n")
+    file.write(f"Desired Fungi: {round(float(total_des_fungi), 5)}\n"
+               f"Bone Meal Used: {round(float(bm_for_prod), 5)}\n")
+    file.write(f"Coords: {coords_str}\n")
+    for row in range(size.length):
+        for col in range(size.width):
+            if [row, col, UNCLEARED] in placement:
+                file.write(f"[{coords.index([row, col]) + 1}]")
+            elif [row, col, CLEARED] in placement:
+                file.write("{" + str(coords.index([row, col]) + 1) + "}")
+            elif (row, col) in blocked_blocks:
+                file.write("[/]")
+            else:
+                file.write("[ ]")
+        file.write("\n")
+    file.write("\n")
+
+def open_layout_atlas(path: str, mode="r") -> np.memmap | None:
+    """
+    Memory map the records of a layout atlas, indexed by
+    [nylium type, length - 1, width - 1, cycles - 1, dispensers - 1], so looking one up only
+    reads that record from disk. None if there's no atlas there or it doesn't match this version.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < ATLAS_HEADER.itemsize:
+        return None
+    header = np.fromfile(path, ATLAS_HEADER, count=1)[0]
+    dims = (header["max_length"], header["max_width"], header["max_cycles"], header["max_disps"])
+    if header["magic"] != ATLAS_MAGIC or header["version"] != ATLAS_VERSION \
+       or dims != ATLAS_SHAPE[1:] or header["wb_per_fungus"] != ALL_WB_PER_FUNGUS:
+        return None
+    return np.memmap(path, ATLAS_RECORD, mode, offset=ATLAS_HEADER.itemsize, shape=ATLAS_SHAPE)
+
+def lookup_layout_atlas(L: PlayerlessCore) -> Tuple[List[Dispenser], float] | None:
+    """
+    Get the precomputed optimal layout and its desired fungi for a standard configuration: no
+    blocked blocks or clearing dispensers, the default wart blocks/fungus, optimising desired
+    fungi and within the MAX_ALL_ limits. None for anything else, or if it's not in the atlas.
+    """
+    global layout_atlas
+    if L.blocked_blocks or any(d.cleared == CLEARED for d in L.disp_coords) \
+       or L.objective != "fungi" or L.wb_per_fungus != ALL_WB_PER_FUNGUS \
+       or not 1 <= L.size.length <= MAX_ALL_LENGTH or not 1 <= L.size.width <= MAX_ALL_WIDTH \
+       or not 1 <= L.cycles <= MAX_ALL_CYCLES or not 1 <= L.num_disps <= MAX_ALL_AVG_NUM_DISPS:
+        return None
+    if layout_atlas is None:
+        atlas = open_layout_atlas(resource_path(ATLAS_PATH))
+        layout_atlas = False if atlas is None else atlas
+    if layout_atlas is False:
+        return None
+
+    record = layout_atlas[L.nylium_type, L.size.length - 1, L.size.width - 1, L.cycles - 1,
+                          L.num_disps - 1]
+    if record["fungi"] <= 0:
+        return None
+    disp_coords = [Dispenser(int(row), int(col), NULL_TIME, UNCLEARED)
+                   for row, col in record["layout"][:L.num_disps]]
+    # Stored in single precision, so give the layout's desired fungi in full
+    total_des_fungi, _ = fast_calc_fung_dist(L.size.length, L.size.width, L.nylium_type,
+                                             disp_coords, L.cycles, [])
+    return disp_coords, total_des_fungi
+
+def build_layout_atlas(path=ATLAS_PATH, workers: int = None, run_time=ALL_RUN_TIME,
+                       max_side=MAX_ALL_WIDTH, max_cycles=MAX_ALL_CYCLES,
+                       max_disps=MAX_ALL_AVG_NUM_DISPS):
+    """
+    Offline batch job optimising every standard configuration (see lookup_layout_atlas) of both
+    nylium types for 'run_time' seconds each, one per worker process (default is one per CPU
+    core), and writing their optimal layouts to the layout atlas at 'path', which ships with the
+    program in src/Assets. Run this module to build it, e.g. with build.sh --atlas.\n
+    Each platform is only optimised with its length no more than its width, the other way round
+    being the same layout transposed. Records are written as soon as they're found and filled ones
+    are skipped, so the job can be stopped and picked up again later.\n
+    'max_side', 'max_cycles' and 'max_disps' only fill in the configurations up to them, e.g. to
+    build a small atlas to test with.
+    """
+    if open_layout_atlas(path) is None:
+        header = np.array([(ATLAS_MAGIC, ATLAS_VERSION, *ATLAS_SHAPE[1:], ALL_WB_PER_FUNGUS)],
+                          ATLAS_HEADER)
+        with open(path, "wb") as file:
+            file.write(header.tobytes())
+            file.write(np.zeros(ATLAS_SHAPE, ATLAS_RECORD).tobytes())
+    atlas = open_layout_atlas(path, "r+")
+
+    configs = [
+        (nylium_type, length, width, cycles, num_disps)
+        for nylium_type, length, cycles in itertools.product(
+            ATLAS_NYLIUM_TYPES, range(1, min(max_side, MAX_ALL_LENGTH) + 1),
+            range(1, min(max_cycles, MAX_ALL_CYCLES) + 1)
+        )
+        for width in range(length, min(max_side, MAX_ALL_WIDTH) + 1)
+        for num_disps in range(1, min(max_disps, MAX_ALL_AVG_NUM_DISPS, length * width) + 1)
+        if atlas[nylium_type, length - 1, width - 1, cycles - 1, num_disps - 1]["fungi"] <= 0
+    ]
+    print(f"Optimising {len(configs)} layout atlas configurations")
+    start_time = time.time()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(optimise_atlas_config, *config, run_time): config
+                   for config in configs}
+        for n, future in enumerate(as_completed(futures), start=1):
+            nylium_type, length, width, cycles, num_disps = futures[future]
+            layout, total_des_fungi, bm_for_prod = future.result()
+            if layout is None:
+                continue
+            record = np.zeros((), ATLAS_RECORD)
+            record["fungi"], record["bone_meal"] = total_des_fungi, bm_for_prod
+            record["layout"][:num_disps] = layout[:, :2]
+            atlas[nylium_type, length - 1, width - 1, cycles - 1, num_disps - 1] = record
+            if width <= MAX_ALL_LENGTH and length <= MAX_ALL_WIDTH:
+                record["layout"][:num_disps] = layout[:, 1::-1]
+                atlas[nylium_type, width - 1, length - 1, cycles - 1, num_disps - 1] = record
+            atlas.flush()
+            print(f"{n}/{len(configs)}: {'Warped' if nylium_type == WARPED else 'Crimson'}",
+                  f"{length}x{width},",
+                  f"{cycles} cycle(s), {num_disps} dispenser(s): {total_des_fungi} fungi",
+                  f"({round(time.time() - start_time)} seconds)")
+
+def optimise_atlas_config(nylium_type, length, width, cycles, num_disps, run_time
+                          ) -> Tuple[np.ndarray | None, float, float]:
+    """Optimise one layout atlas configuration (in a worker process for build_layout_atlas),
+    returning its layout, desired fungi and bone meal, or no layout if none fits in the limit"""
+    L = PlayerlessCore(num_disps, [], Dimensions(length, width), nylium_type, cycles, [],
+                       ALL_WB_PER_FUNGUS, 1.0, run_time, False)
+    # The optimiser's running commentary would drown out the job's progress
+    with contextlib.redirect_stdout(io.StringIO()):
+        disp_coords, total_des_fungi, _ = start_optimisation(L, workers=1)
+    layout = disp_coords_to_array(disp_coords)
+    if total_des_fungi <= 0 or np.any(layout[:, :2] < 0):
+        return None, 0.0, 0.0
+    return layout, *fast_calc_fung_dist(length, width, nylium_type, layout, cycles, [])
+
+######################################
+# Research and development functions #
+######################################
+def reference_huge_fungus_grids(des_fungi_grid) -> np.ndarray:
+    """The original voxel by voxel loop that calc_huge_fungus_grids replaced, kept as a reference
+    to check the vectorised version against"""
+    p_length, p_width = des_fungi_grid.shape
     hf_grids = np.zeros((
         len(BLOCK_TYPES) + 1,
-        hf_width,
-        hf_length,
+        NT_MAX_RAD + p_width + NT_MAX_RAD,
+        NT_MAX_RAD + p_length + NT_MAX_RAD,
         NT_MAX_HT
     ))
 
@@ -193,133 +769,100 @@ def calc_huge_fungus_distribution(
                 gen_chance = (1 - curr) * weighted_chance
                 hf_grids[b, nylium_z + z, nylium_x + x, y] += gen_chance
                 hf_grids[3, nylium_z + z, nylium_x + x, y] += gen_chance
+    return hf_grids
 
-    total_wb = np.sum(hf_grids[2]) * L.blast_chamber_effic
-    return total_wb, bm_for_prod
+def compare_huge_fungus_engines(sizes=((1, 1), (3, 7), (10, 10), (20, 20)), trials=3, seed=0):
+    """Check calc_huge_fungus_grids matches the reference loop on random fungus grids, including
+    empty cells and non-square platforms, and print how long each takes."""
+    rng = np.random.default_rng(seed)
+    for length, width in sizes:
+        ref_time = vec_time = 0.0
+        for _ in range(trials):
+            des_fungi_grid = rng.random((length, width)) * CRMS_FUNG_CHANCE
+            des_fungi_grid[rng.random((length, width)) < 0.2] = 0
 
-def remove_duplicates(nested_list):
-    """Remove duplicate sublists from a list of sublists of coordinates"""
-    # Convert each sublist of coordinates to a tuple of tuples
-    unique_set = {tuple(map(tuple, sublist)) for sublist in nested_list}
-    # Convert back to a list of lists
-    unique_list = [list(map(list, sublist)) for sublist in unique_set]
-    return unique_list
-
-def generate_transformations(coords, s: Dimensions):
-    """Generate all reflections, rotations, and permutations of the optimal coordinates"""
-    alt_coords = []
-    l = s.length
-    w = s.width
-    coords = [[coord.row, coord.col, coord.cleared] for coord in coords]
-    for coord in coords:
-        transformed_coords = [coord]
-        # cs: cleared status
-        row, col, cs = coord
-        # 180deg rotation
-        transformed_coords.append([l-1-row, w-1-col, cs])
-        # 90deg ccw and cw rotations are only equivalent for square grids
-        if l == w:
-            transformed_coords.append([col, l-1-row, cs])
-            transformed_coords.append([w-1-col, row, cs])
-        for i, sub_coord in enumerate(transformed_coords):
-            if i > 3:
-                break
-            row1 = sub_coord[0]
-            col1 = sub_coord[1]
-            # Up/down reflection
-            transformed_coords.append([row1, w-1-col1, cs])
-            # Right/left reflection
-            transformed_coords.append([l-1-row1, col1, cs])
-        alt_coords.append(transformed_coords)
-    alt_placements = []
-    # Grab equally transformed sets of coords to group into consecutive sets of alternate optimal coords
-    for i in range(len(alt_coords[0])):
-        alt_placements.append([coords[i] for coords in alt_coords])
-
-    # Skip if there are more than 8 dispensers as the number of permutations is too high
-    if len(coords) > 8:
-        return remove_duplicates(alt_placements)
-    
-    # Generate all permutations of dispenser order including new reflections and rotations
-    perms = []
-    for placement in alt_placements:
-        sub_perms = list(itertools.permutations(placement))
-        sub_perms_list = [list(perm) for perm in sub_perms]
-        perms.extend(sub_perms_list)
-    # Remove duplicate permutations to lower computation time
-    return remove_duplicates(perms)
-
-def output_viable_coords(L: PlayerlessCore, optimal_coords, optimal_value):
-    """Run through all reflections, rotations, and permutations of the optimal coordinates
-    and record all solution within 0.1% of the best solution to a file."""
-    # try:
-    start_time = time.time()
-    org_disp_coords = L.disp_coords
-    worst_value = optimal_value
-    coords_list_metrics = []
-    for coords in generate_transformations(optimal_coords, L.size):
-        L.disp_coords = [
-            Dispenser(coords[0], coords[1], NULL_TIME, coords[2]) for coords in coords
-        ]
-        dist_data = calculate_fungus_distribution(L)
-        total_des_fungi = dist_data.total_des_fungi
-        bm_for_prod = dist_data.bm_for_prod
-
-        bm_req = bm_for_prod < L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
-        if total_des_fungi < worst_value and bm_req:
-            worst_value = total_des_fungi
-        if abs(total_des_fungi - optimal_value) / optimal_value <= 0.001 and bm_req:
-            coords_list_metrics.append((total_des_fungi, bm_for_prod, coords))
-
-    # Sort the list by the desired fungi value
-    coords_list_metrics.sort(key=lambda row: row[0], reverse=True)
-    L.disp_coords = org_disp_coords
-    return export_alt_placements(L.size, coords_list_metrics, optimal_value,
-                                    worst_value, start_time, L.blocked_blocks)
-    # except Exception as e:
-    #     print("An error has occured whilst finding viable coordinates:", e)
-    #     return e
-
-def export_alt_placements(size: Dimensions, metrics, optimal_value, worst_value, start_time,
-                          blocked_blocks) -> int:
-    """Write the sorted list to a file"""
-    num_alt_placements = len(metrics)
-    f = open("Alternate Dispenser Placements.txt", "w")
-    f.write(f"Number of alternate placements: {num_alt_placements}\n")
-    lost_f = optimal_value - worst_value
-    worst_loss = round(lost_f / optimal_value * 100, 5)
-    lost_f = round(lost_f, 5)
-    f.write(f"Max efficiency loss without caring about order: {worst_loss}% ({lost_f} fungi/cycle)\n\n")
-    for i, (total_des_fungi, bm_for_prod, placements) in enumerate(metrics, start=1):
-        coords = [[pos[0], pos[1]] for pos in placements]
-        coords_str = '['
-        for j, (row, col) in enumerate(coords):
-            if [row, col, CLEARED] in placements:
-                coords_str += '{' + str(row) + ', ' + str(col) + '}'
-            else:
-                coords_str += '[' + str(row) + ', ' + str(col) + ']'
-            
-            if j != len(coords) - 1:
-                coords_str += ', '
-            else:
-                coords_str += ']'
-            
-        f.write(f"#{i}:\n")
-        f.write(f"Desired Fungi: {round(total_des_fungi, 5)}\n"
-                f"Bone Meal Used: {round(bm_for_prod, 5)}\n")
-        f.write(f"Coords: {coords_str}\n")
-        for row in range(size.length):
-            for col in range(size.width):
-                if [row, col, UNCLEARED] in placements:
-                    f.write(f"[{coords.index([row, col]) + 1}]")
-                elif [row, col, CLEARED] in placements:
-                    f.write("{" + str(coords.index([row, col]) + 1) + "}")
-                elif (row, col) in blocked_blocks:
-                    f.write("[/]")
-                else:
-                    f.write("[ ]")
-            f.write("\n")
-        f.write("\n")
-    f.close()
-    print("Alternate placements calculated in:", round(time.time() - start_time, 3), "seconds")
-    return num_alt_placements
\ No newline at end of file
+            start_time = time.perf_counter()
+            ref_grids = reference_huge_fungus_grids(des_fungi_grid)
+            ref_time += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            vec_grids = calc_huge_fungus_grids(des_fungi_grid)
+            vec_time += time.perf_counter() - start_time
+
+            if not np.array_equal(ref_grids, vec_grids):
+                max_diff = np.max(np.abs(ref_grids - vec_grids))
+                raise AssertionError(f"Huge fungus engines differ on a {length}x{width} platform "
+                                     f"by up to {max_diff}")
+
+        print(f"{length}x{width}: loop {ref_time / trials:.4f}s, "
+              f"vectorised {vec_time / trials:.4f}s, "
+              f"{ref_time / vec_time:.1f}x faster")
+
+def validate_engine_precision(layout_paths="layouts/*.yaml", dtype=np.float32) -> float:
+    """Run every layout through the engines in both float64 and the given reduced precision dtype,
+    and print the relative error of the desired fungi, bone meal and wart blocks of each one.\n
+    Returns the maximum relative error over all of them, which needs to stay well under the 0.1%
+    that output_viable_coords treats as equally optimal for the reduced precision to be trusted."""
+    def rel_error(approx, exact):
+        return abs(float(approx) - float(exact)) / max(abs(float(exact)), 1e-12)
+
+    max_error = 0.0
+    for file_path in sorted(glob.glob(layout_paths)):
+        L = PlayerlessCore.from_yaml(file_path)
+        L.disp_coords.sort(key=lambda d: d.timestamp)
+        args = (L.size.length, L.size.width, L.nylium_type, L.disp_coords, L.cycles,
+                L.blocked_blocks)
+        # The optimiser's engine
+        fungi_64, bm_64 = fast_calc_fung_dist(*args)
+        fungi_32, bm_32 = fast_calc_fung_dist(*args, dtype=dtype)
+        # The full breakdown and huge fungi behind the final results
+        dist_64 = calculate_distribution(L)
+        dist_32 = calculate_distribution(L, dtype=dtype)
+        wb_64 = np.sum(calc_huge_fungus_grids(dist_64.total_des_fungi_grid)[2])
+        wb_32 = np.sum(calc_huge_fungus_grids(dist_32.total_des_fungi_grid, dtype)[2])
+
+        errors = {
+            "fungi": rel_error(fungi_32, fungi_64),
+            "bone meal": rel_error(bm_32, bm_64),
+            "breakdown": rel_error(np.sum(dist_32.total_des_fungi_grid),
+                                   np.sum(dist_64.total_des_fungi_grid)),
+            "wart blocks": rel_error(wb_32, wb_64)
+        }
+        max_error = max(max_error, *errors.values())
+        print(f"{file_path}: " + ", ".join(f"{k} {v:.2e}" for k, v in errors.items()))
+
+    print(f"Max relative error of {np.dtype(dtype).name}: {max_error:.2e}")
+    return max_error
+
+def benchmark_engine_backends(layout_paths="layouts/*.yaml", trials=20):
+    """Time each available engine backend on every layout and print how long one foliage and one
+    huge fungus calculation takes on average. The first call of each is left out of the timings,
+    as that's when the JIT backends compile."""
+    print(f"Available engine backends: {', '.join(ENGINE_BACKENDS)}")
+    for file_path in sorted(glob.glob(layout_paths)):
+        L = PlayerlessCore.from_yaml(file_path)
+        L.disp_coords.sort(key=lambda d: d.timestamp)
+        args = (L.size.length, L.size.width, L.nylium_type, L.disp_coords, L.cycles,
+                L.blocked_blocks)
+        des_fungi_grid = calculate_distribution(L).total_des_fungi_grid
+        print(file_path)
+        for backend in ENGINE_BACKENDS.values():
+            fungi, _ = backend.calc_fung_dist(*args)
+            backend.calc_huge_fungus_grids(des_fungi_grid)
+
+            start_time = time.perf_counter()
+            for _ in range(trials):
+                backend.calc_fung_dist(*args)
+            fung_time = (time.perf_counter() - start_time) / trials
+
+            start_time = time.perf_counter()
+            for _ in range(trials):
+                backend.calc_huge_fungus_grids(des_fungi_grid)
+            hf_time = (time.perf_counter() - start_time) / trials
+
+            print(f"  {backend.name}: fungi {fungi:.6f}, foliage {fung_time * 1e3:.3f}ms, "
+                  f"huge fungi {hf_time * 1e3:.3f}ms")
+
+if __name__ == "__main__":
+    # Build (or pick up building) the layout atlas from the repo root, which takes a long while
+    build_layout_atlas()
@@ -2,6 +2,9 @@
 
 import math
 import time
+import queue
+import sqlite3
+import threading
 import psutil
 
 import numpy as np
@@ -14,10 +17,14 @@ from src.Assets import colours
 from src.Assets.constants import *
 from src.Assets.data_classes import *
 from src.Assets.helpers import ToolTip, set_title_and_icon, export_custom_heatmaps, resource_path, \
-    show_custom_message, program_window_counter, all_program_instances
+    show_custom_message, program_window_counter, all_program_instances, heatmap_export_paths
 from src.Playerless_Core_Tools_Backend import calc_huge_fungus_distribution, \
-    calculate_fungus_distribution, output_viable_coords
-from src.Stochastic_Optimisation import start_optimisation
+    calculate_fungus_distribution, output_viable_coords, lookup_layout_atlas, \
+    ALT_PLACEMENTS_PATH, ALT_SAMPLES, MAX_ALT_SEARCH_DISPS
+from src.Stochastic_Optimisation import start_optimisation, start_pareto_optimisation, \
+    array_to_disp_coords, ParetoArchive
+from src.Fast_Dispenser_Distribution import ENGINE_BACKENDS
+from src.Assets.result_store import ResultStore
 
 # Testing notes
 # - Run tests on 5x5 and 4x5 for num dispensers 1-5, cycles = 3 to see where the optimal solution
@@ -27,7 +34,6 @@ from src.Stochastic_Optimisation import start_optimisation
 # fix bug where worst case without caring about order takes into account all layouts, not strictly 
 # different orderings
 # move nylium switch and reset button to be on the same level as the optimise and heatmap button
-# move calibrate run time into the file menu and maybe consider a new algo for it
 # run time and blast effic labels dont show upon start and after importing
 #   - this doesn't matter too much though as these will become message boxes in the future probs
 # Add option to literally simulate a layout to a desired confidence interval
@@ -41,6 +47,7 @@ from src.Stochastic_Optimisation import start_optimisation
 # General settings
 DEFAULT_RUN_TIME = 7
 MAX_UPDATE_SCHEDULE_DELAY = 750
+OPTIMISATION_POLL_DELAY = 50
 INIT_UPDATES = 2
 SLIDER_MAX_CYCLES = 5
 
@@ -64,6 +71,19 @@ RUN_TIME_VALS = [1, 4, 7, 10, 15, 30, 60, 300, 1000]
 # Efficiency values
 BC_EFFIC_VALS = [0.0, 0.5, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1]
 
+# Optimiser precision values, final results are always calculated in full precision
+ENGINE_DTYPE_VALS = {"Full (float64)": "float64", "Fast (float32)": "float32"}
+
+# Engine backends, the compiled ones needing their optional package installed
+ENGINE_BACKEND_VALS = {"NumPy": "numpy", "Numba (JIT)": "numba"}
+
+# Optimisers, parallel tempering being better at escaping the local optima of big layouts
+OPTIMISER_VALS = {"Simulated Annealing": "annealing", "Parallel Tempering": "tempering"}
+
+# What the optimiser maximises, and the units its progress is printed in
+OBJECTIVE_VALS = {"Desired Fungi": "fungi", "Wart Blocks": "wart_blocks"}
+OBJECTIVE_UNITS = {"fungi": "fungi/cycle", "wart_blocks": "wart blocks/cycle"}
+
 ###########################
 ### CLASSES & FUNCTIONS ###
 ###########################
@@ -145,6 +165,8 @@ class App:
         self.checkboxes = []    # 2D array of checkboxes to store the state of each dispenser
         self.updates = 0        # Track if the layout has been loaded after starting the program
         self.update_job = None  # Track the latest scheduled layout/grid update/calculation job
+        self.optimisation = None  # Worker thread of the running optimisation, if there is one
+        self.result_store = None  # Opened the first time something's optimised
 
         self.init_gui()
     
@@ -186,6 +208,10 @@ class App:
         file_menu.add_command(label="Import Layout", command=self.import_layout)
         file_menu.add_command(label="Export Layout", command=self.export_layout)
         file_menu.add_command(label="Export Custom Heatmaps", command=self.export_heatmaps)
+        file_menu.add_command(label="Export Custom Heatmaps (.npy)",
+                              command=lambda: self.export_heatmaps("npy"))
+        file_menu.add_command(label="Export Custom Heatmaps (.csv)",
+                              command=lambda: self.export_heatmaps("csv"))
 
         help_menu = tk.Menu(toolbar, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
         toolbar.add_cascade(label="Help", menu=help_menu)
@@ -194,9 +220,59 @@ class App:
         help_menu.add_command(label="Advanced Features", command=self.show_advanced_features)
 
         config_menu = tk.Menu(toolbar, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
-        config_menu.add_command(label="Calibrate Run Time", command=self.calibrate_run_time)
         toolbar.add_cascade(label="Config", menu=config_menu)
 
+        precision_menu = tk.Menu(config_menu, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
+        config_menu.add_cascade(label="Optimiser Precision", menu=precision_menu)
+        self.engine_dtype_var = tk.StringVar(value=self.L.engine_dtype)
+        for label, dtype in ENGINE_DTYPE_VALS.items():
+            precision_menu.add_radiobutton(
+                label=label,
+                variable=self.engine_dtype_var,
+                value=dtype,
+                command=lambda dtype1=dtype: self.set_engine_dtype(dtype1)
+            )
+
+        backend_menu = tk.Menu(config_menu, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
+        config_menu.add_cascade(label="Engine Backend", menu=backend_menu)
+        self.engine_backend_var = tk.StringVar(value=self.L.engine_backend)
+        for label, backend in ENGINE_BACKEND_VALS.items():
+            available = backend in ENGINE_BACKENDS
+            backend_menu.add_radiobutton(
+                label=label if available else f"{label} - not installed",
+                variable=self.engine_backend_var,
+                value=backend,
+                state=tk.NORMAL if available else tk.DISABLED,
+                command=lambda backend1=backend: self.set_engine_backend(backend1)
+            )
+
+        optimiser_menu = tk.Menu(config_menu, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
+        config_menu.add_cascade(label="Optimiser", menu=optimiser_menu)
+        self.optimiser_var = tk.StringVar(value=self.L.optimiser)
+        for label, optimiser in OPTIMISER_VALS.items():
+            optimiser_menu.add_radiobutton(
+                label=label,
+                variable=self.optimiser_var,
+                value=optimiser,
+                command=lambda optimiser1=optimiser: self.set_optimiser(optimiser1)
+            )
+
+        objective_menu = tk.Menu(config_menu, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
+        config_menu.add_cascade(label="Objective", menu=objective_menu)
+        self.objective_var = tk.StringVar(value=self.L.objective)
+        for label, objective in OBJECTIVE_VALS.items():
+            objective_menu.add_radiobutton(
+                label=label,
+                variable=self.objective_var,
+                value=objective,
+                command=lambda objective1=objective: self.set_objective(objective1)
+            )
+
+        # Optimise for every wart blocks/fungus at once, picking a layout from the results after
+        self.trade_offs_var = tk.BooleanVar(value=False)
+        config_menu.add_checkbutton(label="Find Fungi/Bone Meal Trade-offs",
+                                    variable=self.trade_offs_var)
+
         run_time_menu = tk.Menu(toolbar, tearoff=0, font=("Segoe UI", int((RSF**0.7)*12)))
         toolbar.add_cascade(label="Run Time", menu=run_time_menu)
         for time in RUN_TIME_VALS:
@@ -217,16 +293,6 @@ class App:
                 command=lambda effic1=effic: self.set_bce(effic1)
             )
 
-        # Set default CPU iteration time for the simulated annealing algorithm
-        file_path = resource_path("cpu_benchmark.txt")
-        with open(file_path, "a+") as f:
-            # Move the cursor to the start of the file
-            f.seek(0)
-            data = f.readline().strip()
-            if not data:
-                f.seek(0)
-                f.write(f"{BASE_CPU_ITER_TIME}\n")
-
     def create_widgets(self):
         self.master.configure(bg=colours.bg)
         style = ttk.Style()
@@ -354,30 +420,150 @@ class App:
     ### FEATURES ###
     ################
     def optimise(self):
-        """Optimise the placement of dispensers on the nylium grid"""
+        """
+        Optimise the placement of dispensers on the nylium grid on a worker thread, animating
+        each better layout found on the grid as it goes. Pressing the button again cancels it,
+        keeping the best layout found so far.\n
+        Standard configurations (see lookup_layout_atlas) are answered straight from the layout
+        atlas. If the same configuration's been optimised for at least as long before, its stored
+        best layout is shown straight away, otherwise optimising carries on from it.
+        """
+        if self.optimisation is not None:
+            self.optimisation_cancel.set()
+            return
         if self.L.num_disps == 0:
             return
 
+        # Copy everything the worker thread reads, as the grid keeps changing while it runs
         L_optimise = PlayerlessCore(
             num_disps=self.L.num_disps,
-            disp_coords=self.L.disp_coords,
-            size=self.L.size,
+            disp_coords=[d.copy() for d in self.L.disp_coords],
+            size=Dimensions(self.L.size.length, self.L.size.width),
             nylium_type=self.L.nylium_type,
             cycles=self.L.cycles,
-            blocked_blocks=self.L.blocked_blocks,
+            blocked_blocks=list(self.L.blocked_blocks),
             wb_per_fungus=self.L.wb_per_fungus,
             blast_chamber_effic=self.L.blast_chamber_effic,
             run_time=self.L.run_time,
-            additional_property=False
+            additional_property=False,
+            engine_dtype=self.L.engine_dtype,
+            engine_backend=self.L.engine_backend,
+            optimiser=self.L.optimiser,
+            objective=self.L.objective
         )
-        # TODO Run this on a separate thread and progessively return make more optimised layouts
-        # to animate them SEE TEST.PY
-        optimal_coords, optimal_value, iterations = start_optimisation(L_optimise)
+        find_trade_offs = self.trade_offs_var.get()
+        atlas_entry = None if find_trade_offs else lookup_layout_atlas(L_optimise)
+        if atlas_entry is not None:
+            print("Using the layout atlas' optimal layout")
+            self.finish_optimisation(*atlas_entry, 0)
+            return
 
+        stored = None
+        if not find_trade_offs and self.open_result_store():
+            try:
+                stored = self.result_store.lookup(L_optimise)
+            except sqlite3.Error as e:
+                print("An error has occured whilst reading stored optimisation results:", e)
+        if stored is not None and stored.total_time >= L_optimise.run_time:
+            print(f"Using the best of {stored.num_runs} stored optimisation run(s)",
+                  f"({round(stored.total_time, 1)} seconds in total)")
+            self.finish_optimisation(stored.disp_coords, stored.energy, stored.iterations)
+            return
+
+        # The worker thread never touches Tk, it only passes messages back through the queue
+        self.optimisation_queue = queue.Queue()
+        self.optimisation_cancel = threading.Event()
+        self.optimisation = threading.Thread(target=self.run_optimisation,
+                                             args=(L_optimise, find_trade_offs, stored),
+                                             daemon=True)
+        self.additional_property_button.config(text="Cancel")
+        self.optimisation.start()
+        self.master.after(OPTIMISATION_POLL_DELAY, self.poll_optimisation)
+
+    def open_result_store(self) -> bool:
+        """Open the optimisation result store if it isn't already, returning whether it's open"""
+        if self.result_store is None:
+            try:
+                self.result_store = ResultStore()
+            except (sqlite3.Error, OSError) as e:
+                print("An error has occured whilst opening the optimisation result store:", e)
+        return self.result_store is not None
+
+    def run_optimisation(self, L_optimise: PlayerlessCore, find_trade_offs=False,
+                         stored: StoredOptimum = None):
+        """Run the optimiser on the worker thread, sending its progress and result to the queue,
+        refining the 'stored' best layout of previous runs if there is one and recording the new
+        best layout in the result store"""
+        try:
+            if find_trade_offs:
+                archive = start_pareto_optimisation(
+                    L_optimise,
+                    progress=lambda snapshot: self.optimisation_queue.put(("progress", snapshot)),
+                    cancel=self.optimisation_cancel
+                )
+                self.optimisation_queue.put(("trade-offs", archive))
+                return
+            start_time = time.perf_counter()
+            result = start_optimisation(
+                L_optimise,
+                progress=lambda snapshot: self.optimisation_queue.put(("progress", snapshot)),
+                cancel=self.optimisation_cancel,
+                start_layout=None if stored is None else stored.disp_coords
+            )
+            optimal_coords, optimal_value, iterations = result
+            if self.result_store is not None and optimal_value > 0 \
+               and all(d.row != -1 for d in optimal_coords):
+                try:
+                    self.result_store.record(L_optimise, optimal_coords, optimal_value,
+                                             iterations, time.perf_counter() - start_time)
+                except sqlite3.Error as e:
+                    print("An error has occured whilst storing the optimisation result:", e)
+            self.optimisation_queue.put(("done", result))
+        except Exception as e:
+            self.optimisation_queue.put(("error", e))
+
+    def poll_optimisation(self):
+        """Check on the running optimisation from the Tk main loop, drawing the latest layout"""
+        snapshot = None
+        while True:
+            try:
+                message, data = self.optimisation_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message == "progress":
+                snapshot = data
+                continue
+
+            self.optimisation = None
+            self.additional_property_button.config(text="Optimise")
+            if message == "error":
+                messagebox.showwarning("Error", f"An error has occurred whilst optimising:\n{data}")
+            elif message == "trade-offs":
+                self.show_trade_offs(data)
+            else:
+                self.finish_optimisation(*data)
+            return
+
+        # Only the newest layout is worth drawing if a few have built up
+        if snapshot is not None:
+            print(f"Iteration {snapshot.iteration}: {snapshot.optimal_energy}",
+                  OBJECTIVE_UNITS.get(self.L.objective, "fungi/cycle"))
+            self.show_layout(snapshot.best_solution)
+        self.master.after(OPTIMISATION_POLL_DELAY, self.poll_optimisation)
+
+    def show_layout(self, disp_coords: List[Dispenser]):
+        """Replace the dispensers on the grid with the given ones, in order"""
+        self.reset_grid(remove_blocked=False)
+        for disp_coord in disp_coords:
+            self.add_dispenser(disp_coord.row, disp_coord.col, disp_coord.cleared)
+
+    def finish_optimisation(self, optimal_coords, optimal_value, iterations):
+        """Show the final result of an optimisation once it's finished or been cancelled"""
         if optimal_coords == -1:
             messagebox.showwarning("Error", "Maximum runtime exceeded.")
             return
-        elif ([-1, -1, UNCLEARED] in optimal_coords or len(optimal_coords) == 0):
+        elif (len(optimal_coords) == 0 or optimal_value <= 0
+              or any(d.row == -1 for d in optimal_coords)):
             messagebox.showinfo(
                 "Optimisation Notice",
                 "No optimal solution found for\n"
@@ -385,19 +571,60 @@ class App:
             )
             return
 
-        self.reset_grid(remove_blocked=False)
-        for disp_coord in optimal_coords:
-            self.add_dispenser(disp_coord.row, disp_coord.col, disp_coord.cleared)
+        self.show_layout(optimal_coords)
+        # Alternate placements are always compared by their desired fungi
+        if self.L.objective != "fungi":
+            optimal_value = calculate_fungus_distribution(self.L).total_des_fungi
         # Generate a list of other viable coords that are as optimal or within 0.1% of the most
         # optimal found solution, storing them in an external file
         self.print_viable_coords(output_viable_coords(self.L, optimal_coords, optimal_value))
 
+    def show_trade_offs(self, archive: ParetoArchive):
+        """
+        List the layouts found by a trade-off optimisation in their own window, from the least bone
+        meal per fungus to the most fungi, showing whichever's picked on the grid. Starts on the
+        best layout for the current wart blocks/fungus.
+        """
+        if len(archive) == 0:
+            messagebox.showinfo("Optimisation Notice", "No trade-offs found.")
+            return
+
+        window = tk.Toplevel(self.master)
+        set_title_and_icon(window, "Fungi/Bone Meal Trade-offs")
+        window.configure(bg=colours.bg)
+        trade_offs_font = font.Font(family='Segoe UI', size=int((RSF**NLS)*9))
+        listbox = tk.Listbox(window, width=70, height=min(len(archive), 20), bg=colours.bg,
+                             fg=colours.fg, font=trade_offs_font, exportselection=False)
+        listbox.pack(side="left", fill="both", expand=True, padx=PAD, pady=PAD)
+        scrollbar = tk.Scrollbar(window, orient="vertical", command=listbox.yview)
+        scrollbar.pack(side="right", fill="y")
+        listbox.config(yscrollcommand=scrollbar.set)
+
+        for fungi, bone_meal in zip(archive.fungi, archive.bone_meal):
+            # The least wart blocks/fungus that would let the optimiser pick this layout
+            wb_per_fungus = (bone_meal + AVG_BM_TO_GROW_FUNG) * WARTS_PER_BM
+            listbox.insert(tk.END, f"{round(fungi, DP)} fungi/cycle, "
+                                   f"{round(bone_meal / fungi, DP) if fungi != 0 else 0.0} bone meal/fungus, "
+                                   f"needs over {round(wb_per_fungus, 1)} wart blocks/fungus")
+
+        def show_trade_off(_=None):
+            selection = listbox.curselection()
+            if selection:
+                self.show_layout(array_to_disp_coords(archive.layouts[selection[0]]))
+
+        listbox.bind("<<ListboxSelect>>", show_trade_off)
+        best = archive.best_within(self.L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG)
+        listbox.selection_set(max(best, 0))
+        listbox.see(max(best, 0))
+        show_trade_off()
+
     def calculate(self, dist_data=None):
         """Calculate the fungus distribution and bone meal usage for the nylium grid"""
 
-        # Calculate fungus distribution if not provided
+        # Calculate fungus distribution if not provided, with its breakdown so selecting a block
+        # afterwards can reuse it
         if dist_data is None:
-            dist_data = calculate_fungus_distribution(self.L)
+            dist_data = calculate_fungus_distribution(self.L, breakdown=True)
 
         total_foliage = dist_data.total_foliage
         total_des_fungi = dist_data.total_des_fungi
@@ -606,17 +833,16 @@ class App:
         else:
             self.D.selected_block = (row, col)
         
-        dist_data = calculate_fungus_distribution(self.L)
-        disp_foliage_grids = dist_data.disp_foliage_grids
-        disp_des_fungi_grids = dist_data.disp_des_fungi_grids
+        dist_data = calculate_fungus_distribution(self.L, breakdown=True)
+        sel_foliage, sel_fungi = dist_data.breakdown.block(row, col)
         
         info_labels = [
             f"{'Warped' if self.L.nylium_type == WARPED else 'Crimson'} Fungi at {(row, col)}",
             f"Foliage at {(row,col)}",
         ]
 
-        sel_fungi_amount = np.sum(disp_des_fungi_grids, axis=(0,1))[row, col]
-        sel_foliage_amount = np.sum(disp_foliage_grids, axis=(0,1))[row, col] - sel_fungi_amount
+        sel_fungi_amount = np.sum(sel_fungi)
+        sel_foliage_amount = np.sum(sel_foliage) - sel_fungi_amount
         info_values = [
             round(sel_fungi_amount, DP),
             round(sel_foliage_amount, DP)
@@ -628,16 +854,9 @@ class App:
                          if (row, col) == (coord.row, coord.col))
             bone_meal_used = 0
             for cycle in range(self.L.cycles):
-                # First sum only earlierly ordered dispensers affect the current one
-                if cycle == 0:
-                    if index == 0:
-                        cycle_sum = np.zeros((self.row_slider.get(), self.col_slider.get()))
-                    else:
-                        cycle_sum = np.sum(disp_foliage_grids[:index, cycle, :, :], axis=0)
-                else:
-                    cycle_sum = np.sum(disp_foliage_grids[:, :cycle, :, :], axis=(0, 1))
-                    cycle_sum += np.sum(disp_foliage_grids[:index, cycle, :, :], axis=0)
-                bone_meal_used += 1 - cycle_sum[row, col]
+                # Only earlierly ordered dispensers affect the current one in the same cycle
+                cycle_sum = np.sum(sel_foliage[:, :cycle]) + np.sum(sel_foliage[:index, cycle])
+                bone_meal_used += 1 - cycle_sum
 
             info_labels.append(f"{'Warped' if self.L.nylium_type == WARPED else 'Crimson'} "
                                f"Fungi Produced")
@@ -646,7 +865,7 @@ class App:
             info_labels.append("Position")
             info_labels.append("Cleared")
 
-            fungi_produced = np.sum(disp_des_fungi_grids[index])
+            fungi_produced = np.sum(dist_data.breakdown.disp_des_fungi_grids(index))
             info_values.append(round(fungi_produced, DP))
             info_values.append(round(bone_meal_used, DP))
             info_values.append(round(bone_meal_used / fungi_produced, DP))
@@ -697,6 +916,22 @@ class App:
         """Set the run time of the optimisation algorithm."""
         self.L.run_time = time
 
+    def set_engine_dtype(self, dtype):
+        """Set the float precision the optimisation algorithm's engines work in."""
+        self.L.engine_dtype = dtype
+
+    def set_engine_backend(self, backend):
+        """Set the engine backend used by the optimisation algorithm and huge fungus calculations."""
+        self.L.engine_backend = backend
+
+    def set_optimiser(self, optimiser):
+        """Set the algorithm used to optimise the placement of dispensers."""
+        self.L.optimiser = optimiser
+
+    def set_objective(self, objective):
+        """Set whether the optimisation algorithm maximises desired fungi or wart blocks."""
+        self.L.objective = objective
+
     ######################
     ### INPUT & OUTPUT ###
     ######################
@@ -725,55 +960,22 @@ class App:
             self.L.to_yaml(file_path)
             print(f"Layout exported to {file_path}")
 
-    def calibrate_run_time(self):
-        """Runs a benchmark optimisation test to measure user's processing speed and modify 
-        cooling rate accordingly"""
-        # Run test with 4 uncleared dispensers, 3 times
-        disp_coords = [Dispenser(0, 0, t, UNCLEARED) for t in range(0, 4)]
-        num_tests = 3
-        des_run_time = 15
-
-        for i in range(0, num_tests):
-            start_time = time.time()
-            f = open(resource_path("cpu_benchmark.txt"), "r+")
-            L_calibrate = PlayerlessCore(
-                num_disps=4,
-                disp_coords=disp_coords,
-                size=Dimensions(5, 5),
-                nylium_type=WARPED,
-                cycles=1,
-                blocked_blocks=[],
-                wb_per_fungus=120,
-                blast_chamber_effic=1.0,
-                run_time=des_run_time,
-                additional_property=True
-            )
-            _, _, iterations = start_optimisation(L_calibrate)
-
-            total_iter_time = (time.time() - start_time)
-            time_diff_percent = 100 * (total_iter_time - des_run_time) / des_run_time
-            time_per_iter = total_iter_time / iterations
-
-            f.write(str(time_per_iter))
-            f.close()
-
-            print(f"Calibration loop {i} run time misalignment: {time_diff_percent}%")
-            print(f"Iteration time: {time_per_iter}\n")
-    
-    def export_heatmaps(self):
+    def export_heatmaps(self, file_format="xlsx"):
         """Export custom heatmaps based on the fungus distribution of the nylium grid"""
         # Calculate fungus distribution     
-        disp_des_fungi_grids = calculate_fungus_distribution(self.L).disp_des_fungi_grids
+        des_fungi_grid = calculate_fungus_distribution(self.L).total_des_fungi_grid
         platform_dims = Dimensions(self.col_slider.get(), self.row_slider.get())
 
         result = export_custom_heatmaps(
             platform_dims,
-            np.sum(disp_des_fungi_grids, axis=(0,1))
+            des_fungi_grid,
+            file_format
         )
 
         if result == 0:
             messagebox.showinfo("Success",
-                                "Heatmaps successfully exported to weighted_fungi_heatmap.xlsx")
+                                "Heatmaps successfully exported to "
+                                f"{', '.join(heatmap_export_paths(file_format))}")
         else:
             error_message = f"An error has occurred:\n{result}"
             if not error_message.endswith(('.', '?', '!')):
@@ -784,16 +986,16 @@ class App:
         if isinstance(result, (int, float)) and not isinstance(result, BaseException):
             # 8 transformations for a square grid, 4 for a rectangular grid
             transforms = 8 if self.col_slider.get() == self.row_slider.get() else 4
-            trimmed_string = (
-                f"\n\nNote {transforms * math.factorial(self.L.num_disps) - 8:,} possible "
-                "alternate placements (permutations of firing order) were trimmed "
-                "for computational reasons."
+            sampled_string = (
+                f"\n\nNote only {transforms * ALT_SAMPLES:,} of the "
+                f"{transforms * math.factorial(self.L.num_disps):,} possible alternate placements "
+                "(permutations of firing order) were sampled for computational reasons."
             )
-            file_path = "Alternate Dispenser Placements.txt"
+            file_path = ALT_PLACEMENTS_PATH
             message = (
                 f"Successfully exported {result} alternate "
                 f"placement{'s' if result != 1 else ''} to {file_path}."
-                f"{trimmed_string if self.L.num_disps > 8 else ''}"
+                f"{sampled_string if self.L.num_disps > MAX_ALT_SEARCH_DISPS else ''}"
             )
             show_custom_message(
                 title="Success",
@@ -863,6 +1065,10 @@ class App:
         self.update_nylium_type(self.L.nylium_type, skip_calc=True)
         self.nylium_switch.assign(self.L.nylium_type)
         self.nylium_switch.nylium_type = self.L.nylium_type
+        self.engine_dtype_var.set(self.L.engine_dtype)
+        self.engine_backend_var.set(self.L.engine_backend)
+        self.optimiser_var.set(self.L.optimiser)
+        self.objective_var.set(self.L.objective)
 
     def update_layout_vals(self, _=None):
         """Update layout values and schedule update_grid if not loaded."""
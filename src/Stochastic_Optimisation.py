@@ -1,90 +1,576 @@
 """
 Simulated annealing algorithm for optimising the distribution of dispensers on a nylium platform.
 """
-import math
+import os
 import time
+import queue
+import bisect
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
 
 import pandas as pd
 import numpy as np
-from numpy.random import randint as rand_s
 
 from src.Assets.constants import *
-from src.Assets.helpers import resource_path
 from src.Assets.data_classes import *
-from src.Fast_Dispenser_Distribution import fast_calc_fung_dist
+from src.Assets.instrumentation import instrument, count
+from src.Fast_Dispenser_Distribution import fast_calc_fung_dist, compile_blocked_mask, \
+    disp_coords_to_array, get_engine_backend, IncrementalFungDist, CanonicalEvalCache, \
+    fast_calc_wart_dist, batch_calc_wart_dist, IncrementalWartDist
 
-# TODO Investigate adaptive cooling rates, 
-# and different cooling schedules (balance exploration and exploitation)
+# TODO Investigate different cooling schedules (balance exploration and exploitation)
 # optimsie generate neighbour function to use problem specific knowledge
 
 ACCEPTANCE_RATE = 0.995
 REJECTION_POINT = 0.1
 MAX_ITERATIONS = 1000000
 NULL_TIME = 0
+# How many iterations to run between re-measuring throughput and adjusting the cooling rate
+RESCHEDULE_INTERVAL = 100
+# Parallel tempering
+NUM_REPLICAS = 8
+SWAP_INTERVAL = 10
+# Minimum seconds between progress reports, so whatever's listening isn't flooded with layouts
+PROGRESS_INTERVAL = 0.25
+# How often generate_neighbour makes each type of move: step every dispenser, step one dispenser,
+# swap the firing order of two dispensers, or flip the cleared status of one
+NEIGHBOUR_MOVES = {"shift": 0.5, "single": 0.3, "swap": 0.1, "flip": 0.1}
+# Row and column steps a dispenser can take in one move
+STEPS = np.array([[-1, -1], [-1, 0], [-1, 1], [0, -1], [0, 0], [0, 1], [1, -1], [1, 0], [1, 1]])
+# Random layouts evaluated per batch when estimating the temperature bounds, and how tight the 95%
+# confidence interval of their mean energy needs to be (relative to the energy change) to stop
+TEMP_BOUNDS_BATCH = 256
+TEMP_BOUNDS_REL_ERROR = 0.01
+# Temperature bounds already estimated this session, by optimisation problem
+temp_bounds_cache = {}
+# Most passes greedy_solution makes moving each placed dispenser to its best block, and the share
+# of the run time it can spend on them before settling for each dispenser's first placement
+GREEDY_ROUNDS = 3
+GREEDY_TIME_SHARE = 0.25
+# Chance a typical worse neighbour of the greedy starting layout is accepted at the start, how
+# many neighbours are sampled to find what's typical, and how much it cools down to from there
+WARM_START_ACCEPTANCE = 0.2
+WARM_START_SAMPLES = 64
+WARM_START_COOLING = 100
+# Number of each chain's latest best solutions the full voxel model re-scores at the end when
+# optimising wart blocks through their surrogate
+NUM_FINAL_CANDIDATES = 8
+# Most trade-off layouts a ParetoArchive keeps, and how many runs with ever lower bone meal limits
+# start_pareto_optimisation splits its run time between
+PARETO_ARCHIVE_SIZE = 64
+PARETO_STAGES = 8
 
-def start_optimisation(L: PlayerlessCore) -> Tuple[List[Dispenser], float, int]:
-    """Start optimising the function using the simulated annealing algorithm."""
+class ParetoArchive:
+    """
+    The non-dominated layouts seen over (desired fungi, bone meal), i.e. no other layout in the
+    archive grows at least as many fungi for no more bone meal.\n
+    Bone meal is the bm_for_prod the optimisers' bone meal limit applies to, so the best layout for
+    any wb_per_fungus is in here (see best_within). A layout with more fungi for less bone meal
+    also uses less bone meal per fungus, so the front over bone meal per fungus is in here too.\n
+    Entries are sorted by bone meal, and so by fungi as well. Past 'max_size' entries, whichever
+    one's neighbours are closest together is dropped, keeping the front evenly covered.
+    """
+    def __init__(self, max_size=PARETO_ARCHIVE_SIZE):
+        self.max_size = max_size
+        self.fungi = []
+        self.bone_meal = []
+        self.layouts = []
+
+    def __len__(self):
+        return len(self.layouts)
+
+    def add(self, layout, fungi, bone_meal) -> bool:
+        """Add a layout if nothing in the archive dominates it, returning whether it was added"""
+        fungi, bone_meal = float(fungi), float(bone_meal)
+        # Everything before 'n' uses less bone meal, so the one just before has the most fungi
+        n = bisect.bisect_left(self.bone_meal, bone_meal)
+        if n > 0 and self.fungi[n - 1] >= fungi:
+            return False
+        if n < len(self) and self.bone_meal[n] == bone_meal and self.fungi[n] >= fungi:
+            return False
+        # Drop the layouts using at least as much bone meal for no more fungi
+        end = n
+        while end < len(self) and self.fungi[end] <= fungi:
+            end += 1
+        self.fungi[n:end] = [fungi]
+        self.bone_meal[n:end] = [bone_meal]
+        self.layouts[n:end] = [np.array(layout)]
+        if len(self) > self.max_size:
+            self.thin()
+        return True
+
+    def thin(self):
+        """Drop the entry (other than the two ends) sitting in the most crowded part of the front"""
+        fungi, bone_meal = np.array(self.fungi), np.array(self.bone_meal)
+        gaps = (fungi[2:] - fungi[:-2]) / max(fungi[-1] - fungi[0], 1e-12) \
+               + (bone_meal[2:] - bone_meal[:-2]) / max(bone_meal[-1] - bone_meal[0], 1e-12)
+        n = int(np.argmin(gaps)) + 1
+        del self.fungi[n], self.bone_meal[n], self.layouts[n]
+
+    def merge(self, other: "ParetoArchive"):
+        """Add all of another archive's layouts"""
+        for layout, fungi, bone_meal in zip(other.layouts, other.fungi, other.bone_meal):
+            self.add(layout, fungi, bone_meal)
+
+    def best_within(self, bm_limit) -> int:
+        """Index of the layout growing the most fungi for under 'bm_limit' bone meal, or -1"""
+        return bisect.bisect_left(self.bone_meal, bm_limit) - 1
+
+@instrument()
+def start_optimisation(
+    L: PlayerlessCore,
+    workers: int = None,
+    seed: int = None,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None,
+    archive: ParetoArchive = None,
+    start_layout: List[Dispenser] = None,
+    executor: ProcessPoolExecutor = None,
+    manager: Any = None
+) -> Tuple[List[Dispenser], float, int]:
+    """
+    Start optimising the function using the optimiser named by L.optimiser, simulated annealing
+    by default, or parallel tempering.\n
+    Every chain starts from a greedily built layout (see greedy_solution) at temperatures derived
+    from it (see warm_start_temps), running one independent chain per worker process (default is
+    one per CPU core) each with its own RNG stream, and returns the best layout of them all.
+    A single worker runs one chain in this process instead. A 'seed' repeats the starting layout,
+    temperatures and each chain's random choices, but as the chains run until the clock runs out
+    rather than for a set number of iterations, how far they get (and so the result) can differ.
+    L.run_time counts from when this is called, so setting up the chains comes out of it.\n
+    'progress' is called with a ProgressSnapshot whenever a better layout's been found (at most
+    every PROGRESS_INTERVAL seconds), and setting the 'cancel' threading.Event stops optimising
+    early, still returning the best layout found so far. Both work from any thread.
+    Every layout the optimisers evaluate is offered to 'archive' if one's given, and giving a
+    'start_layout' (e.g. a previous run's best) refines it instead of a greedily built layout.
+    Back to back runs can share one 'executor' and 'manager' (see multi_start_annealing) rather
+    than each starting up their own processes.\n
+    L.objective picks whether desired fungi or wart blocks are maximised. Wart blocks are
+    optimised through wart_surrogate, only running the full voxel model on the best few
+    layouts found (see rescore_wart_candidates).
+    """
+    start_time = time.time_ns()
+    end_time = time.time() + L.run_time
+    if workers is None:
+        workers = os.cpu_count() or 1
     if L.num_disps == 0:
         return [], 0
     has_cleared = False
     if CLEARED in [d.cleared for d in L.disp_coords]:
         has_cleared = True
-    optimise_func = fast_calc_fung_dist
-    temps = calculate_temp_bounds(L, optimise_func, has_cleared)
-    # Start with all worst case dispensers off the grid with no clearing
-    init_sol = [Dispenser(-1, -1, NULL_TIME, UNCLEARED) for _ in range(L.num_disps)]
+    backend = get_engine_backend(L.engine_backend)
+    if L.objective == "wart_blocks":
+        optimise_func, batch_optimise_func = fast_calc_wart_dist, batch_calc_wart_dist
+    else:
+        optimise_func, batch_optimise_func = backend.calc_fung_dist, backend.batch_calc_fung_dist
+    # Setting up draws from its own stream, and the chains spawn theirs from the same sequence
+    seed_seq = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_seq.spawn(1)[0])
+    # Cached bounds would leave the stream somewhere else for the rest of a seeded run
+    temps = calculate_temp_bounds(L, optimise_func, has_cleared, rng, batch_optimise_func,
+                                  use_cache=seed is None)
+    blocked_mask = compile_blocked_mask(L.size.length, L.size.width, L.blocked_blocks)
+    # Start from a greedily built layout rather than spending the run getting anywhere decent
+    if start_layout is not None:
+        warm_sol = disp_coords_to_array(start_layout)
+    else:
+        warm_sol = greedy_solution(L, has_cleared, blocked_mask, batch_optimise_func, rng,
+                                   end_time - (1 - GREEDY_TIME_SHARE) * L.run_time, end_time,
+                                   cancel)
+    warm_energy, warm_bm = optimise_func(L.size.length, L.size.width, L.nylium_type, warm_sol,
+                                         L.cycles, blocked_mask, dtype=L.engine_dtype)
+    # Until something valid is found, the best solution is all dispensers off the grid
+    init_sol = np.array([[-1, -1, UNCLEARED]] * L.num_disps)
     S = SimAnnealingParams(
         optimise_func=optimise_func,
-        current_energy=0,
+        current_energy=warm_energy,
         optimal_energy=0,
-        initial_solution=init_sol,
-        current_solution=init_sol, # Start with the worst case solution
+        initial_solution=warm_sol,
+        current_solution=warm_sol,
         best_solution=init_sol,
         start_temp=temps[0],               
         end_temp=temps[1],  
-        cooling_rate=calculate_cooling_rate(temps[0], temps[1], L.run_time),
-        max_iterations=MAX_ITERATIONS
+        cooling_rate=1.0, # Set on the fly to finish cooling as the run time runs out
+        max_iterations=MAX_ITERATIONS,
+        batch_optimise_func=batch_optimise_func,
+        end_time=end_time,
+        archive=None if archive is None else ParetoArchive(archive.max_size)
     )
-    start_time = time.time_ns()
-   
-    iterations = math.floor(math.log(S.end_temp / S.start_temp) / math.log(S.cooling_rate)) + 1
-    print(f"\nStarting temp: {S.start_temp}",
+    S.start_temp, S.end_temp = warm_start_temps(L, S, has_cleared, blocked_mask, rng)
+    optimiser = OPTIMISERS.get(L.optimiser, simulated_annealing)
+
+    print(f"\nEngine backend: {backend.name} ({L.engine_dtype})",
+          f"\nOptimiser: {optimiser.__name__}",
+          f"\nObjective: {L.objective}",
+          f"\nChains: {workers}",
+          f"\nStarting temp: {S.start_temp}",
           f"\nEnding temp: {S.end_temp}", 
-          f"\nCooling rate: {S.cooling_rate}",
-          f"\nIterations: {iterations}\n")
+          f"\nRun time: {L.run_time} seconds",
+          f"({max(end_time - time.time(), 0):.2f} left after setting up)\n")
 
-    out = simulated_annealing(L, S, has_cleared)
+    if workers > 1:
+        out = multi_start_annealing(L, S, has_cleared, workers, seed_seq, optimiser, progress,
+                                    cancel, executor, manager)
+    else:
+        out = annealing_chain(L, S, has_cleared, seed_seq.spawn(1)[0], optimiser, progress,
+                              cancel)
+    # The greedy layout itself is never an accepted neighbour, so check it separately
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+    if archive is not None:
+        archive.merge(out.archive)
+        archive.add(warm_sol, warm_energy, warm_bm)
+    if warm_bm < bm_limit and warm_energy > out.optimal_energy:
+        out.best_solution, out.optimal_energy = warm_sol, warm_energy
+    if optimise_func == fast_calc_wart_dist and out.optimal_energy > 0:
+        candidates = out.candidates + [warm_sol] if warm_bm < bm_limit else out.candidates
+        out.best_solution, out.optimal_energy = rescore_wart_candidates(
+            L, candidates, backend.calc_huge_fungus_grids
+        )
+    # Whatever precision the engines optimised in, report the best layout in full precision
+    elif L.engine_dtype != "float64" and out.optimal_energy > 0:
+        out.optimal_energy = optimise_func(L.size.length, L.size.width, L.nylium_type,
+                                           out.best_solution, L.cycles, L.blocked_blocks)[0]
     
     print("Time taken to optimise:", (time.time_ns() - start_time )/ 1e9, "seconds")
+    print("Iterations:", out.iterations)
+    count("optimiser moves accepted", out.moves_accepted)
+    count("optimiser moves rejected", out.moves_rejected)
+    count("evaluation cache hits", out.cache_hits)
+    count("evaluation cache misses", out.cache_misses)
+    best_solution = array_to_disp_coords(out.best_solution)
+    if out.cache_hits + out.cache_misses > 0:
+        lookups = out.cache_hits + out.cache_misses
+        print(f"Evaluation cache: {out.cache_hits} hits, {out.cache_misses} misses",
+              f"({100 * out.cache_hits / lookups:.1f}% hit rate)")
 
-    return out.best_solution, out.optimal_energy, iterations
+    return best_solution, out.optimal_energy, out.iterations
+
+def start_pareto_optimisation(
+    L: PlayerlessCore,
+    workers: int = None,
+    seed: int = None,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None
+) -> ParetoArchive:
+    """
+    Find the trade-off between desired fungi and the bone meal they take in one run, rather than
+    a run for each wb_per_fungus, returning a ParetoArchive to pick a layout from afterwards.\n
+    L.run_time is split between PARETO_STAGES optimisations (see start_optimisation), the first
+    without a bone meal limit to find the most fungi possible, then with limits stepping down
+    evenly to the least bone meal the archive's seen so far. Every layout any of them evaluates
+    is offered to the archive. Cancelling stops before the next stage.\n
+    Only the first stage builds a greedy layout, the rest refine the archive's best layout within
+    their limit, and all of them share one pool of worker processes.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    archive = ParetoArchive()
+    L_stage = replace(L, objective="fungi", run_time=L.run_time / PARETO_STAGES,
+                      wb_per_fungus=np.inf)
+    # Always spawn rather than fork, as forking a process running Tk (and its threads) isn't safe
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager() if workers > 1 and (progress is not None or cancel is not None) \
+        else None
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context) if workers > 1 \
+        else None
+    try:
+        for stage in range(PARETO_STAGES):
+            if cancel is not None and cancel.is_set():
+                break
+            start_layout = None
+            if stage > 0 and len(archive) > 0:
+                # The most fungi found sets the top of the range, the least bone meal the bottom
+                bm_limit = archive.bone_meal[-1] + (archive.bone_meal[0] - archive.bone_meal[-1]) \
+                           * stage / (PARETO_STAGES - 1)
+                L_stage.wb_per_fungus = (bm_limit + AVG_BM_TO_GROW_FUNG) * WARTS_PER_BM
+                best_n = archive.best_within(bm_limit)
+                if best_n >= 0:
+                    start_layout = array_to_disp_coords(archive.layouts[best_n])
+            start_optimisation(L_stage, workers, None if seed is None else seed + stage, progress,
+                               cancel, archive, start_layout, executor, manager)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if manager is not None:
+            manager.shutdown()
+    return archive
 
 def simulated_annealing(
     L: PlayerlessCore,
     S: SimAnnealingParams,
-    has_cleared=False
+    has_cleared=False,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None
 ) -> SimAnnealingParams:
-    """Simulated annealing algorithm for discrete optimisation of fungus distribution."""
+    """
+    Simulated annealing algorithm for discrete optimisation of fungus distribution.\n
+    Rather than cooling at a fixed rate, the throughput is measured every RESCHEDULE_INTERVAL
+    iterations and the cooling rate set so the temperature reaches end_temp right as S.end_time
+    (or L.run_time from now) is reached, whatever the platform, machine or load.\n
+    Layouts (and their rotations and reflections, unless optimising wart blocks) the chain's
+    already been to are looked up in a CanonicalEvalCache rather than being simulated again.\n
+    See start_optimisation for 'progress' and 'cancel'.
+    """
     temperature = S.start_temp
     S.optimal_energy = 0
-    for _ in range(S.max_iterations):
+    S.candidates = []
+    # Compile the blocked blocks once for the whole run rather than every iteration
+    blocked_mask = compile_blocked_mask(L.size.length, L.size.width, L.blocked_blocks)
+    rng = S.rng
+    # Only re-simulate neighbours from their first moved dispenser onwards when optimising fungi
+    evaluator = None
+    if S.optimise_func == fast_calc_fung_dist:
+        evaluator = IncrementalFungDist(L.size.length, L.size.width, L.nylium_type, L.cycles,
+                                        blocked_mask, dtype=L.engine_dtype)
+    elif S.optimise_func == fast_calc_wart_dist:
+        evaluator = IncrementalWartDist(L.size.length, L.size.width, L.nylium_type, L.cycles,
+                                        blocked_mask, dtype=L.engine_dtype)
+    # Wart blocks depend on the order fungi grow in, so mirrored layouts don't score the same
+    cache = CanonicalEvalCache(L.size.length, L.size.width, L.nylium_type, L.cycles,
+                               L.blocked_blocks, symmetric=S.optimise_func != fast_calc_wart_dist)
+
+    def calc_energy(disp_coords):
+        if evaluator is not None:
+            return evaluator.evaluate(disp_coords)
+        return S.optimise_func(L.size.length, L.size.width, L.nylium_type, disp_coords, L.cycles,
+                               blocked_mask, dtype=L.engine_dtype)
+
+    # Work in perf_counter time from here on as it's much more precise than time.time
+    run_start = time.perf_counter()
+    end_time = run_start + (L.run_time if S.end_time is None else S.end_time - time.time())
+    S.iterations = 0
+    last_report = (0.0, 0.0)
+    for iteration in range(S.max_iterations):
         if temperature < S.end_temp:
             break
-        neighbour_sol = generate_neighbour(S.current_solution, L.size, has_cleared, L.blocked_blocks)
+        if iteration % RESCHEDULE_INTERVAL == 0:
+            now = time.perf_counter()
+            if now >= end_time or cancel is not None and cancel.is_set():
+                break
+            last_report = report_progress(progress, S, temperature, last_report)
+            if iteration > 0:
+                # Cool just enough each of the remaining iterations to finish on time
+                iter_time = (now - run_start) / iteration
+                remaining = min((end_time - now) / iter_time, S.max_iterations - iteration)
+                S.cooling_rate = (S.end_temp / temperature) ** (1 / max(remaining, 1))
+        S.iterations += 1
+        neighbour_sol = generate_neighbour(S.current_solution, L.size, has_cleared, blocked_mask,
+                                           rng)
         # Either desired fungi produced, or potential wart blocks generated
-        neighbour_energy, bm_for_prod = S.optimise_func(L.size.length, L.size.width, L.nylium_type,
-                                                        neighbour_sol, L.cycles, L.blocked_blocks)
+        hits = cache.hits
+        neighbour_energy, bm_for_prod = cache.evaluate(neighbour_sol,
+                                                       lambda: calc_energy(neighbour_sol))
+        if S.archive is not None:
+            S.archive.add(neighbour_sol, neighbour_energy, bm_for_prod)
         bm_req = bm_for_prod < L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
         if neighbour_energy > S.current_energy and bm_req or \
-           np.random.rand() < acceptance_probability(S.current_energy, neighbour_energy, temperature):
+           rng.random() < acceptance_probability(S.current_energy, neighbour_energy, temperature):
             S.current_solution = neighbour_sol
             S.current_energy = neighbour_energy
+            S.moves_accepted += 1
+            # Cached layouts never reach the evaluator, which is still exact working on from
+            # whichever layout it last accepted
+            if evaluator is not None and cache.hits == hits:
+                evaluator.accept()
             if bm_req and neighbour_energy > S.optimal_energy:
                 S.best_solution = neighbour_sol
                 S.optimal_energy = neighbour_energy
+                S.candidates.append(neighbour_sol)
+                del S.candidates[:-NUM_FINAL_CANDIDATES]
 
         temperature *= S.cooling_rate
-    S.optimal_energy
+    S.cache_hits, S.cache_misses = cache.hits, cache.misses
+    S.moves_rejected = S.iterations - S.moves_accepted
+    report_progress(progress, S, temperature, last_report, force=True)
+    return S
+
+def report_progress(
+    progress: Callable[[ProgressSnapshot], Any],
+    S: SimAnnealingParams,
+    temperature: float,
+    last_report: Tuple[float, float],
+    force=False
+) -> Tuple[float, float]:
+    """
+    Pass a snapshot of the best solution so far on to 'progress' if it's improved since the last
+    report, and PROGRESS_INTERVAL seconds have passed (unless forced).\n
+    Returns the (time, energy) of the last report for the next call.
+    """
+    now = time.perf_counter()
+    if progress is None or S.optimal_energy <= last_report[1] \
+       or not force and now - last_report[0] < PROGRESS_INTERVAL:
+        return last_report
+    progress(ProgressSnapshot(S.iterations, float(temperature),
+                              array_to_disp_coords(S.best_solution), float(S.optimal_energy)))
+    return now, S.optimal_energy
+
+def multi_start_annealing(
+    L: PlayerlessCore,
+    S: SimAnnealingParams,
+    has_cleared: ClearedStatus,
+    workers: int,
+    seed: Any = None,
+    optimiser: Callable = None,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None,
+    executor: ProcessPoolExecutor = None,
+    manager: Any = None
+) -> SimAnnealingParams:
+    """Run independent simulated annealing (or other optimiser) chains across a pool of processes,
+    all with the same cooling schedule, and return the one that found the best solution.\n
+    The chains' progress reports are forwarded to 'progress' whenever one beats all the others.
+    A pool 'executor' and 'manager' given are used and left running, otherwise they're started
+    up (and shut down) just for these chains. 'seed' can be a SeedSequence to spawn the chains'
+    seeds from, rather than an int to start one from."""
+    optimiser = simulated_annealing if optimiser is None else optimiser
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    # Spawned seeds give each chain its own statistically independent RNG stream
+    seeds = seed.spawn(workers)
+    # Always spawn rather than fork, as forking a process running Tk (and its threads) isn't safe
+    context = multiprocessing.get_context("spawn")
+    # Chains can only talk back to this process through a manager's queue and event
+    own_manager = manager is None and (progress is not None or cancel is not None)
+    if own_manager:
+        manager = context.Manager()
+    progress_queue = manager.Queue() if manager is not None else None
+    shared_cancel = manager.Event() if manager is not None else None
+    pool = nullcontext(executor) if executor is not None \
+        else ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        with pool as executor:
+            chain_progress = progress_queue.put if progress_queue is not None else None
+            futures = [executor.submit(annealing_chain, L, S, has_cleared, chain_seed, optimiser,
+                                       chain_progress, shared_cancel) for chain_seed in seeds]
+            best_energy = 0.0
+            while manager is not None:
+                # Keep going until every chain's finished and all their reports are through
+                finished = all(future.done() for future in futures)
+                if cancel is not None and cancel.is_set():
+                    shared_cancel.set()
+                try:
+                    snapshot = progress_queue.get(block=not finished, timeout=PROGRESS_INTERVAL)
+                except queue.Empty:
+                    if finished:
+                        break
+                    continue
+                if progress is not None and snapshot.optimal_energy > best_energy:
+                    best_energy = snapshot.optimal_energy
+                    progress(snapshot)
+            chains = [future.result() for future in futures]
+    finally:
+        if own_manager:
+            manager.shutdown()
+    best_chain = max(chains, key=lambda chain: chain.optimal_energy)
+    best_chain.cache_hits = sum(chain.cache_hits for chain in chains)
+    best_chain.cache_misses = sum(chain.cache_misses for chain in chains)
+    best_chain.moves_accepted = sum(chain.moves_accepted for chain in chains)
+    best_chain.moves_rejected = sum(chain.moves_rejected for chain in chains)
+    best_chain.candidates = [layout for chain in chains for layout in chain.candidates]
+    if best_chain.archive is not None:
+        for chain in chains:
+            if chain is not best_chain:
+                best_chain.archive.merge(chain.archive)
+    return best_chain
+
+def annealing_chain(
+    L: PlayerlessCore,
+    S: SimAnnealingParams,
+    has_cleared: ClearedStatus,
+    seed: np.random.SeedSequence,
+    optimiser: Callable = None,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None
+) -> SimAnnealingParams:
+    """Run one optimiser chain (in a worker process for multi_start_annealing) from
+    S.initial_solution, with all its random choices drawn from a generator seeded by 'seed'"""
+    S.rng = np.random.default_rng(seed)
+    S.current_solution = S.initial_solution
+    S.current_energy = S.optimise_func(L.size.length, L.size.width, L.nylium_type,
+                                       S.current_solution, L.cycles, L.blocked_blocks,
+                                       dtype=L.engine_dtype)[0]
+    optimiser = simulated_annealing if optimiser is None else optimiser
+    return optimiser(L, S, has_cleared, progress, cancel)
+
+def parallel_tempering(
+    L: PlayerlessCore,
+    S: SimAnnealingParams,
+    has_cleared=False,
+    progress: Callable[[ProgressSnapshot], Any] = None,
+    cancel: Any = None
+) -> SimAnnealingParams:
+    """
+    Replica exchange (parallel tempering) optimisation of fungus distribution.\n
+    Runs NUM_REPLICAS chains at fixed temperatures spaced geometrically from the start down to the
+    end temperature, evaluating all of their neighbours in one batch each iteration. Every
+    SWAP_INTERVAL iterations, neighbouring temperatures try swapping layouts, so good layouts found
+    by the hot replicas sink down to be refined by the cold ones without any one chain getting
+    stuck in a local optimum. Runs until S.end_time (or for L.run_time seconds), or at most
+    S.max_iterations iterations. See start_optimisation for 'progress' and 'cancel'.
+    """
+    temps = S.start_temp * (S.end_temp / S.start_temp) ** np.linspace(0, 1, NUM_REPLICAS)
+    blocked_mask = compile_blocked_mask(L.size.length, L.size.width, L.blocked_blocks)
+    rng = S.rng
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+
+    def evaluate(layouts):
+        return S.batch_optimise_func(L.size.length, L.size.width, L.nylium_type,
+                                     np.stack(layouts), L.cycles, blocked_mask,
+                                     dtype=L.engine_dtype)
+
+    # The hotter replicas explore from random layouts, the coldest refines the starting layout
+    replicas = [random_solution(L, has_cleared, blocked_mask, rng)
+                for _ in range(NUM_REPLICAS - 1)] + [S.current_solution]
+    energies, _ = evaluate(replicas)
+    S.optimal_energy = 0
+    S.candidates = []
+    end_time = time.time() + L.run_time if S.end_time is None else S.end_time
+    S.iterations = 0
+    last_report = (0.0, 0.0)
+    for iteration in range(S.max_iterations):
+        if time.time() > end_time or cancel is not None and cancel.is_set():
+            break
+        last_report = report_progress(progress, S, temps[-1], last_report)
+        S.iterations += 1
+        neighbours = [generate_neighbour(replica, L.size, has_cleared, blocked_mask, rng)
+                      for replica in replicas]
+        neighbour_energies, bm_for_prod = evaluate(neighbours)
+        if S.archive is not None:
+            for neighbour, energy, bm in zip(neighbours, neighbour_energies, bm_for_prod):
+                S.archive.add(neighbour, energy, bm)
+
+        # Every neighbour's been evaluated anyway, so check them all for a new best solution
+        valid_energies = np.where(bm_for_prod < bm_limit, neighbour_energies, -np.inf)
+        best_n = np.argmax(valid_energies)
+        if valid_energies[best_n] > S.optimal_energy:
+            S.best_solution = neighbours[best_n]
+            S.optimal_energy = float(valid_energies[best_n])
+            S.candidates.append(neighbours[best_n])
+            del S.candidates[:-NUM_FINAL_CANDIDATES]
+
+        # Metropolis criterion of each replica at its own temperature
+        accept_chance = np.exp(np.minimum(neighbour_energies - energies, 0) / temps)
+        accepted = np.flatnonzero(rng.random(NUM_REPLICAS) < accept_chance)
+        for n in accepted:
+            replicas[n] = neighbours[n]
+            energies[n] = neighbour_energies[n]
+        S.moves_accepted += len(accepted)
+        S.moves_rejected += NUM_REPLICAS - len(accepted)
+
+        # Alternate between trying to swap the even and odd pairs of neighbouring temperatures
+        if iteration % SWAP_INTERVAL == 0:
+            for n in range((iteration // SWAP_INTERVAL) % 2, NUM_REPLICAS - 1, 2):
+                swap_exponent = (energies[n + 1] - energies[n]) * (1 / temps[n] - 1 / temps[n + 1])
+                if rng.random() < np.exp(min(swap_exponent, 0)):
+                    replicas[n], replicas[n + 1] = replicas[n + 1], replicas[n]
+                    energies[[n, n + 1]] = energies[[n + 1, n]]
+
+    report_progress(progress, S, temps[-1], last_report, force=True)
+    # Leave the coldest replica as the current solution
+    S.current_solution = replicas[-1]
+    S.current_energy = energies[-1]
     return S
 
 def acceptance_probability(current_energy, neighbour_energy, temperature):
@@ -94,83 +580,265 @@ def acceptance_probability(current_energy, neighbour_energy, temperature):
     else:
         return np.exp((neighbour_energy - current_energy) / temperature)
 
-def generate_neighbour(solution: Any, size: Dimensions, has_cleared: ClearedStatus, 
-                       blocked_blocks: List[Tuple[int, int]]) -> List[Dispenser]:
-    """Generate a new dispenser permutation by altering 1 to all of their coords slightly"""
-    step_h = 1 if size.width != 1 else 0
-    step_v = 1 if size.length != 1 else 0
-    cleared_state = 1
-    if has_cleared == True:
-        cleared_state = 2
-
-    # Create a copy of the current solution
-    neighbour_solution = solution.copy()
-    # Randomly select coords to change
-    indexes_to_change = np.random.choice(len(solution), len(solution), replace=False)
-    positions = [[pos.row, pos.col, NULL_TIME, UNCLEARED] for pos in neighbour_solution]
-    for i in indexes_to_change:
-        # Randomly select a small change in horizontal and vertical coord (-1, 0, or 1)
-        sol_row, sol_col, *_ = positions[i]
-        # Randomly chose between cleared and non-cleared dispenser if there's at least 1 cleared
-        # dispenser in the input field already
-        cleared_val = rand_s(0, cleared_state)
-        new_coords = [
-            max(0, min(size.length - 1, sol_row + rand_s(-step_h, step_h + 1))),
-            max(0, min(size.width - 1, sol_col + rand_s(-step_v, step_v + 1))),
-            NULL_TIME, cleared_val
-        ]
-
-        # Make sure no two coords can be the same
-        else_array = positions[:i] + positions[i+1:]
-        while any([new_coords[0], new_coords[1]] == coord[:2] for coord in else_array) or \
-              (new_coords[0], new_coords[1]) in blocked_blocks:
-            new_coords = [
-                max(0, min(size.length - 1, new_coords[0] + rand_s(-step_h, step_h + 1))), 
-                max(0, min(size.width - 1, new_coords[1] + rand_s(-step_v, step_v + 1))),
-                NULL_TIME, cleared_val
-            ]
-    
-        # Update the solution with the new coord and its cleared status
-        positions[i] = new_coords.copy()
-        neighbour_solution[i] = new_coords
-    neighbour_solution = [Dispenser(*coords) for coords in neighbour_solution]
-    return neighbour_solution
+def generate_neighbour(
+    solution: np.ndarray,
+    size: Dimensions,
+    has_cleared: ClearedStatus,
+    blocked_mask: np.ndarray,
+    rng: np.random.Generator,
+    move: str = None
+) -> np.ndarray:
+    """
+    Generate a new layout from an (n, 3) array of dispenser row, col and cleared status, using
+    one of the NEIGHBOUR_MOVES (picked at random by how often each should be made if not given):\n
+    shift: step every dispenser by up to 1 block in each direction, in a random order, picking
+    their cleared status again if there's at least 1 cleared dispenser in the input field\n
+    single: step just one dispenser\n
+    swap: swap the firing order of two dispensers\n
+    flip: flip the cleared status of one dispenser\n
+    Dispensers stepping onto an occupied or blocked block keep stepping until they're on a free
+    one, checked against an occupancy bitmap of the platform.
+    """
+    num_disps = len(solution)
+    if move is None:
+        moves = [move for move in NEIGHBOUR_MOVES
+                 if (move != "swap" or num_disps > 1) and (move != "flip" or has_cleared)]
+        threshold = rng.random() * sum(NEIGHBOUR_MOVES[move] for move in moves)
+        for move in moves:
+            threshold -= NEIGHBOUR_MOVES[move]
+            if threshold < 0:
+                break
+
+    neighbour = solution.copy()
+    if move == "swap":
+        i, j = rng.choice(num_disps, 2, replace=False)
+        neighbour[[i, j]] = neighbour[[j, i]]
+        return neighbour
+    if move == "flip":
+        i = rng.integers(num_disps)
+        neighbour[i, 2] = CLEARED - neighbour[i, 2]
+        return neighbour
+
+    if move == "shift":
+        indexes = rng.permutation(num_disps).tolist()
+        if has_cleared:
+            neighbour[:, 2] = rng.integers(UNCLEARED, CLEARED + 1, num_disps)
+    else:
+        indexes = [rng.integers(num_disps)]
+    # Platforms 1 block wide or long can only step one way
+    step_mask = np.array([size.length > 1, size.width > 1])
+    steps = (STEPS[rng.integers(len(STEPS), size=len(indexes))] * step_mask).tolist()
+    max_row, max_col = size.length - 1, size.width - 1
+    occupied = blocked_mask.copy()
+    occupied[solution[:, 0], solution[:, 1]] = True
+    for i, (step_row, step_col) in zip(indexes, steps):
+        row, col = neighbour[i, :2].tolist()
+        occupied[row, col] = False
+        new_row = max(0, min(max_row, row + step_row))
+        new_col = max(0, min(max_col, col + step_col))
+        # Make sure no two dispensers can be on the same block
+        while occupied[new_row, new_col]:
+            step_row, step_col = (STEPS[rng.integers(len(STEPS))] * step_mask).tolist()
+            new_row = max(0, min(max_row, new_row + step_row))
+            new_col = max(0, min(max_col, new_col + step_col))
+        occupied[new_row, new_col] = True
+        neighbour[i, :2] = new_row, new_col
+    return neighbour
+
+def random_solution(
+    L: PlayerlessCore,
+    has_cleared: ClearedStatus,
+    blocked_mask: np.ndarray,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """Generate a random valid (n, 3) array of dispenser coords, all on different open blocks"""
+    return random_solutions(L, has_cleared, blocked_mask, 1, rng)[0]
+
+def random_solutions(
+    L: PlayerlessCore,
+    has_cleared: ClearedStatus,
+    blocked_mask: np.ndarray,
+    num_layouts: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """Generate a (num_layouts, n, 3) array of random valid layouts, see random_solution"""
+    open_blocks = np.flatnonzero(~blocked_mask)
+    # A random ordering of the open blocks for each layout, taking the first n as the dispensers
+    picks = np.argsort(rng.random((num_layouts, len(open_blocks))), axis=1)[:, :L.num_disps]
+    rows, cols = np.unravel_index(open_blocks[picks], blocked_mask.shape)
+    cleared = rng.integers(UNCLEARED, CLEARED + 1, rows.shape) if has_cleared \
+        else np.full(rows.shape, UNCLEARED)
+    return np.stack((rows, cols, cleared), axis=2)
+
+def greedy_solution(
+    L: PlayerlessCore,
+    has_cleared: ClearedStatus,
+    blocked_mask: np.ndarray,
+    batch_optimise_func: Callable,
+    rng: np.random.Generator,
+    refine_end_time: float = None,
+    end_time: float = None,
+    cancel: Any = None
+) -> np.ndarray:
+    """
+    Construct a good (n, 3) layout to start optimising from, as the Dracolyer notes of the archived
+    optimiser describe: each new dispenser is added wherever produces the most desired fungi within
+    the bone meal limit, then the dispensers placed so far are each moved to their own best block
+    in turn until none of them move (or GREEDY_ROUNDS is reached).\n
+    All the open blocks a dispenser could go on are scored at once by 'batch_optimise_func'.\n
+    Past 'refine_end_time' the placed dispensers stop being moved, leaving a plain one pass greedy
+    layout, and past 'end_time' (or once 'cancel' is set) the rest go on random free blocks, drawn
+    from 'rng'.
+    """
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+    rows, cols = np.nonzero(~blocked_mask)
+    cleared_states = (UNCLEARED, CLEARED) if has_cleared else (UNCLEARED,)
+    candidates = np.array([(row, col, cleared) for cleared in cleared_states
+                           for row, col in zip(rows.tolist(), cols.tolist())])
+
+    def out_of_time(deadline):
+        return deadline is not None and time.time() >= deadline \
+               or cancel is not None and cancel.is_set()
+
+    def place(layout, n):
+        """Move dispenser n of the layout to its best block, returning its desired fungi"""
+        others = np.delete(layout, n, axis=0)
+        free = ~np.any((candidates[:, None, 0] == others[:, 0])
+                       & (candidates[:, None, 1] == others[:, 1]), axis=1)
+        layouts = np.repeat(layout[None], np.count_nonzero(free), axis=0)
+        layouts[:, n] = candidates[free]
+        energies, bm_for_prod = batch_optimise_func(L.size.length, L.size.width, L.nylium_type,
+                                                    layouts, L.cycles, blocked_mask,
+                                                    dtype=L.engine_dtype)
+        # Settle for the most fungi regardless of bone meal if nothing's within the limit
+        if np.any(bm_for_prod < bm_limit):
+            energies = np.where(bm_for_prod < bm_limit, energies, -np.inf)
+        best = np.argmax(energies)
+        layout[n] = layouts[best, n]
+        return energies[best]
+
+    layout = np.empty((0, 3), dtype=int)
+    for num_placed in range(L.num_disps):
+        if out_of_time(end_time):
+            # Fill in the rest at random so there's still a valid layout to optimise from
+            occupied = blocked_mask.copy()
+            occupied[layout[:, 0], layout[:, 1]] = True
+            free_blocks = rng.permutation(np.flatnonzero(~occupied))
+            rows, cols = np.unravel_index(free_blocks[:L.num_disps - num_placed],
+                                          blocked_mask.shape)
+            cleared = np.full(len(rows), UNCLEARED)
+            return np.vstack((layout, np.column_stack((rows, cols, cleared))))
+
+        layout = np.vstack((layout, candidates[:1]))
+        energy = place(layout, num_placed)
+        for _ in range(GREEDY_ROUNDS):
+            previous_energy = energy
+            for n in range(num_placed):
+                if out_of_time(refine_end_time):
+                    break
+                energy = max(energy, place(layout, n))
+            if energy <= previous_energy:
+                break
+    return layout
+
+def rescore_wart_candidates(
+    L: PlayerlessCore,
+    candidates: List[np.ndarray],
+    hf_grids_func: Callable
+) -> Tuple[np.ndarray, float]:
+    """
+    Run the full voxel model (the given calc_huge_fungus_grids) on the layouts the wart block
+    surrogate rated best, returning whichever really grows the most wart blocks and how many.
+    """
+    evaluator = IncrementalWartDist(L.size.length, L.size.width, L.nylium_type, L.cycles,
+                                    L.blocked_blocks, hf_grids_func=hf_grids_func)
+    energies = [evaluator.evaluate(layout)[0] for layout in candidates]
+    best_n = int(np.argmax(energies))
+    return candidates[best_n], float(energies[best_n])
+
+def array_to_disp_coords(disp_coords: np.ndarray) -> List[Dispenser]:
+    """Convert an (n, 3) array of dispenser row, col and cleared status into a list of them"""
+    return [Dispenser(row, col, NULL_TIME, cleared) for row, col, cleared in disp_coords.tolist()]
 
 def calculate_temp_bounds(
     L: PlayerlessCore,
     optimise_func: Callable,
-    has_cleared: ClearedStatus
+    has_cleared: ClearedStatus,
+    rng: np.random.Generator,
+    batch_optimise_func: Callable = None,
+    use_cache=True
 ) -> Tuple[float, float, float, float]:
-    """Calculate the starting temperature for the simulated annealing algorithm."""
+    """
+    Calculate the starting temperature for the simulated annealing algorithm.\n
+    The average energy is estimated from batches of TEMP_BOUNDS_BATCH random layouts, evaluated
+    all at once by 'batch_optimise_func' (or one by one by 'optimise_func' if not given), until
+    its 95% confidence interval is within TEMP_BOUNDS_REL_ERROR of the energy change, with the
+    layouts drawn from 'rng'.
+    Bounds are cached for the session (unless 'use_cache' is off), so re-optimising the same
+    problem starts straight away.
+    """
+    key = (L.size.length, L.size.width, L.num_disps, L.nylium_type, L.cycles,
+           frozenset(L.blocked_blocks), has_cleared, optimise_func, L.engine_dtype)
+    if use_cache and key in temp_bounds_cache:
+        return temp_bounds_cache[key]
+
     # Find the lowest energy point
-    rand_s = np.random.randint
     lowest_energy = get_lowest_energy(L, optimise_func)
+    blocked_mask = compile_blocked_mask(L.size.length, L.size.width, L.blocked_blocks)
 
-    # Create a valid set of coords by passing it through generate_neighbour
-    average_solutions = []
-    trials = 300 * L.num_disps if optimise_func == fast_calc_fung_dist else 150 * L.num_disps
-    for _ in range(trials):
-        coords = [
-            Dispenser(
-                rand_s(0, L.size.width), rand_s(0, L.size.length), NULL_TIME, UNCLEARED
-            ) for _ in range(L.num_disps)
-        ]
-        average_solutions.append(
-            generate_neighbour(coords, L.size, has_cleared, L.blocked_blocks)
-        )
-    
-    # Calculate the average energy of the initial solution
-    avg_energy = np.mean([
-        optimise_func(
-            L.size.length, L.size.width, L.nylium_type, average_solutions[i], L.cycles, 
-            L.blocked_blocks
-        )[0] for i in range(trials)
-    ])
+    def evaluate(layouts):
+        if batch_optimise_func is not None:
+            return batch_optimise_func(L.size.length, L.size.width, L.nylium_type, layouts,
+                                       L.cycles, blocked_mask, dtype=L.engine_dtype)[0]
+        return np.array([optimise_func(L.size.length, L.size.width, L.nylium_type, layout,
+                                       L.cycles, blocked_mask, dtype=L.engine_dtype)[0]
+                         for layout in layouts])
+
+    # The wart block objective is slower to evaluate, so settle for fewer layouts
+    max_trials = 150 * L.num_disps if optimise_func == fast_calc_wart_dist else 300 * L.num_disps
+    energies = np.empty(0)
+    while len(energies) < max_trials:
+        num_layouts = min(TEMP_BOUNDS_BATCH, max_trials - len(energies))
+        layouts = random_solutions(L, has_cleared, blocked_mask, num_layouts, rng)
+        energies = np.concatenate((energies, evaluate(layouts)))
+        # Calculate the average energy of the initial solution
+        avg_energy = np.mean(energies)
+        half_width = 1.96 * np.std(energies, ddof=1) / np.sqrt(len(energies))
+        if half_width <= TEMP_BOUNDS_REL_ERROR * (avg_energy - lowest_energy):
+            break
 
     high_energy_change = avg_energy - lowest_energy
     start_temperature = -high_energy_change / np.log(ACCEPTANCE_RATE)
     end_temperature = -high_energy_change / np.log(REJECTION_POINT)
-    return start_temperature, end_temperature, lowest_energy, avg_energy
+    temp_bounds_cache[key] = start_temperature, end_temperature, lowest_energy, avg_energy
+    return temp_bounds_cache[key]
+
+def warm_start_temps(
+    L: PlayerlessCore,
+    S: SimAnnealingParams,
+    has_cleared: ClearedStatus,
+    blocked_mask: np.ndarray,
+    rng: np.random.Generator
+) -> Tuple[float, float]:
+    """
+    Calculate lower temperature bounds for optimising from a good starting layout
+    (S.initial_solution), rather than the random layout ones of calculate_temp_bounds which would
+    throw it away straight off, and are still too hot to improve on it by the end.\n
+    A typical worse neighbour of the starting layout is accepted WARM_START_ACCEPTANCE of the time
+    at the start, cooling WARM_START_COOLING times colder by the end. The neighbours are drawn
+    from 'rng'.
+    """
+    neighbours = np.stack([generate_neighbour(S.initial_solution, L.size, has_cleared,
+                                              blocked_mask, rng)
+                           for _ in range(WARM_START_SAMPLES)])
+    energies, _ = S.batch_optimise_func(L.size.length, L.size.width, L.nylium_type, neighbours,
+                                        L.cycles, blocked_mask, dtype=L.engine_dtype)
+    energy_losses = S.current_energy - energies
+    energy_losses = energy_losses[energy_losses > 0]
+    if len(energy_losses) == 0:
+        return S.start_temp, S.end_temp
+    start_temperature = min(-np.mean(energy_losses) / np.log(WARM_START_ACCEPTANCE), S.start_temp)
+    return float(start_temperature), float(start_temperature / WARM_START_COOLING)
 
 def get_lowest_energy(L: PlayerlessCore, optimise_func: Callable) -> float:
     """
@@ -184,27 +852,12 @@ def get_lowest_energy(L: PlayerlessCore, optimise_func: Callable) -> float:
         L.size.length, L.size.width, L.nylium_type,
         [Dispenser(0, 0, NULL_TIME, UNCLEARED) for _ in range(L.num_disps)],
         L.cycles,
-        L.blocked_blocks
+        L.blocked_blocks,
+        dtype=L.engine_dtype
     )[0]
 
-def calculate_cooling_rate(start_temp, end_temp, run_time):
-    # Time taken for the CPU to compute ~one iteration of the simulated annealing algorithm
-    # Dependant on hardware, optimise_func, as well as number of permutations
-    f = open(resource_path("cpu_benchmark.txt"), "r")
-    iter_time = f.readline().strip()
-    f.close()
-    try:
-        # Attempt to convert the iter_time to a float
-        cooling_rate = (end_temp / start_temp) ** (float(iter_time) / int(run_time))
-    except ValueError:
-        # Handle the case where cpu benchmark time is corrupted/unreadable somehow
-        with open(resource_path("cpu_benchmark.txt"), "w") as f:
-            f.write(str(BASE_CPU_ITER_TIME))
-        
-        # Re-run the calculation using the default BASE_CPU_ITER_TIME as iter_time
-        cooling_rate = (end_temp / start_temp) ** (BASE_CPU_ITER_TIME / int(run_time))
-
-    return cooling_rate
+# Optimisers selectable by name, all taking and returning the same SimAnnealingParams
+OPTIMISERS = {"annealing": simulated_annealing, "tempering": parallel_tempering}
 
 ######################################
 # Research and development functions #
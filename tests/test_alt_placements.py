@@ -0,0 +1,76 @@
+"""
+Checks output_viable_coords, which only searches each distinct placement of the dispensers once and
+prunes firing orders that can't be within ALT_TOLERANCE, finds the same alternate placements and
+max efficiency loss as trying every firing order of every reflection and rotation of the layout.
+"""
+import itertools
+import re
+
+import numpy as np
+import pytest
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import batch_calc_fung_dist, fast_calc_fung_dist, \
+    disp_coords_to_array
+import src.Playerless_Core_Tools_Backend as backend
+
+# (nylium, length, width, dispensers (row, col, cleared), cycles, blocked blocks) of the layouts
+# tested, some with blocked blocks that other placements of the dispensers would land on
+CASES = (
+    (WARPED, 4, 4, ((0, 1, 0), (2, 2, 0), (3, 0, 0)), 1, ()),
+    (CRIMSON, 4, 4, ((1, 1, 0), (1, 3, 1), (3, 3, 0), (2, 0, 0)), 1, ((0, 0),)),
+    (WARPED, 5, 3, ((0, 0, 1), (2, 1, 0), (4, 2, 0), (3, 0, 0)), 2, ((4, 0),)),
+    (CRIMSON, 5, 5, ((0, 2, 0), (2, 2, 0), (4, 2, 0), (2, 0, 0), (2, 4, 0)), 1, ((2, 1),)),
+)
+WB_PER_FUNGUS = 120
+
+def brute_force(L: PlayerlessCore, layout: np.ndarray, optimal_value) -> Tuple[int, float]:
+    """Number of placements within ALT_TOLERANCE, and the least desired fungi of any within the
+    bone meal limit, over every firing order of every placement not on a blocked block"""
+    bm_limit = L.wb_per_fungus / WARTS_PER_BM - AVG_BM_TO_GROW_FUNG
+    blocked_blocks = {(row, col) for row, col in L.blocked_blocks}
+    placements = {}
+    for transform in backend.platform_symmetries(L.size.length, L.size.width):
+        placement = backend.transform_layout(transform, layout)
+        if any((row, col) in blocked_blocks for row, col, _ in placement.tolist()):
+            continue
+        placements.setdefault(frozenset(map(tuple, placement.tolist())), placement)
+
+    num_alt_placements, worst_value = 0, optimal_value
+    for placement in placements.values():
+        orders = np.array([placement[list(order)]
+                           for order in itertools.permutations(range(len(placement)))])
+        fungi, bm = batch_calc_fung_dist(L.size.length, L.size.width, L.nylium_type, orders,
+                                         L.cycles, L.blocked_blocks,
+                                         compost_effic=FOLIAGE_COLLECTION_EFFIC)
+        within_limit = bm < bm_limit
+        num_alt_placements += np.count_nonzero(
+            within_limit & (np.abs(fungi - optimal_value) / optimal_value <= backend.ALT_TOLERANCE)
+        )
+        worst_value = min(worst_value, np.min(fungi, initial=np.inf, where=within_limit))
+    return num_alt_placements, worst_value
+
+@pytest.mark.parametrize("nylium_type, length, width, disps, cycles, blocked_blocks", CASES)
+def test_matches_brute_force(tmp_path, monkeypatch, nylium_type, length, width, disps, cycles,
+                             blocked_blocks):
+    # The placements are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    disp_coords = [Dispenser(row, col, n, cleared) for n, (row, col, cleared) in enumerate(disps)]
+    L = PlayerlessCore(len(disps), disp_coords, Dimensions(length, width), nylium_type, cycles,
+                       list(blocked_blocks), WB_PER_FUNGUS, 1.0, 1, False)
+    optimal_value = fast_calc_fung_dist(length, width, nylium_type, disp_coords, cycles,
+                                        L.blocked_blocks)[0]
+
+    num_alt_placements = backend.output_viable_coords(L, disp_coords, optimal_value, workers=1)
+    expected_num, worst_value = brute_force(L, disp_coords_to_array(disp_coords), optimal_value)
+    assert num_alt_placements == expected_num
+
+    text = (tmp_path / backend.ALT_PLACEMENTS_PATH).read_text()
+    assert f"Number of alternate placements: {expected_num}\n" in text
+    worst_loss, lost_f = map(float, re.search(
+        r"Max efficiency loss without caring about order: (\S+)% \((\S+) fungi/cycle\)", text
+    ).groups())
+    assert worst_loss == pytest.approx((optimal_value - worst_value) / optimal_value * 100,
+                                       abs=1e-5)
+    assert lost_f == pytest.approx(optimal_value - worst_value, abs=1e-5)
@@ -0,0 +1,84 @@
+"""
+Checks the compiled numba engines give the same results as the numpy ones they replace, on seeded
+random dispenser layouts, including the batched engine's 'return_grids' and 'compost_effic'.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import ENGINE_BACKENDS, compile_blocked_mask
+from src.Stochastic_Optimisation import random_solutions
+
+# The kernels add up the same chances in the same order, so should agree to within rounding
+RTOL = 1e-12
+ATOL = 1e-12
+# (length, width, dispensers, cycles, blocked blocks) of the platforms tested
+CONFIGS = (
+    (5, 5, 3, 1, []),
+    (7, 4, 5, 2, [(0, 0), (3, 2)]),
+    (1, 6, 3, 1, []),
+    (8, 8, 8, 3, [(4, 4)]),
+)
+NUM_LAYOUTS = 8
+
+@pytest.fixture(scope="module")
+def backends():
+    return ENGINE_BACKENDS["numpy"], ENGINE_BACKENDS["numba"]
+
+def random_layouts(nylium_type, length, width, num_disps, cycles, blocked_blocks) -> np.ndarray:
+    rng = np.random.default_rng(length * width + num_disps + cycles)
+    L = PlayerlessCore(num_disps, [], Dimensions(length, width), nylium_type, cycles,
+                       blocked_blocks, 120, 1.0, 1, False)
+    blocked_mask = compile_blocked_mask(length, width, blocked_blocks)
+    return random_solutions(L, True, blocked_mask, NUM_LAYOUTS, rng)
+
+@pytest.mark.parametrize("nylium_type", (WARPED, CRIMSON))
+@pytest.mark.parametrize("length, width, num_disps, cycles, blocked_blocks", CONFIGS)
+def test_calc_fung_dist_matches(backends, nylium_type, length, width, num_disps, cycles,
+                                blocked_blocks):
+    numpy_backend, numba_backend = backends
+    for layout in random_layouts(nylium_type, length, width, num_disps, cycles, blocked_blocks):
+        np.testing.assert_allclose(
+            numba_backend.calc_fung_dist(length, width, nylium_type, layout, cycles,
+                                         blocked_blocks),
+            numpy_backend.calc_fung_dist(length, width, nylium_type, layout, cycles,
+                                         blocked_blocks),
+            rtol=RTOL, atol=ATOL
+        )
+
+@pytest.mark.parametrize("nylium_type", (WARPED, CRIMSON))
+@pytest.mark.parametrize("length, width, num_disps, cycles, blocked_blocks", CONFIGS)
+@pytest.mark.parametrize("compost_effic", (1.0, FOLIAGE_COLLECTION_EFFIC))
+def test_batch_calc_fung_dist_matches(backends, nylium_type, length, width, num_disps, cycles,
+                                      blocked_blocks, compost_effic):
+    numpy_backend, numba_backend = backends
+    layouts = random_layouts(nylium_type, length, width, num_disps, cycles, blocked_blocks)
+    expected = numpy_backend.batch_calc_fung_dist(length, width, nylium_type, layouts, cycles,
+                                                  blocked_blocks, return_grids=True,
+                                                  compost_effic=compost_effic)
+    results = numba_backend.batch_calc_fung_dist(length, width, nylium_type, layouts, cycles,
+                                                 blocked_blocks, return_grids=True,
+                                                 compost_effic=compost_effic)
+    assert len(results) == 3
+    for result, expect in zip(results, expected):
+        np.testing.assert_allclose(result, expect, rtol=RTOL, atol=ATOL)
+
+    # Without 'return_grids' just the fungi and bone meal come back
+    fungi, bm = numba_backend.batch_calc_fung_dist(length, width, nylium_type, layouts, cycles,
+                                                   blocked_blocks, compost_effic=compost_effic)
+    np.testing.assert_allclose(fungi, expected[0], rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(bm, expected[1], rtol=RTOL, atol=ATOL)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_calc_huge_fungus_grids_matches(backends, seed):
+    numpy_backend, numba_backend = backends
+    rng = np.random.default_rng(seed)
+    des_fungi_grid = rng.random((4, 6)) * CRMS_FUNG_CHANCE
+    des_fungi_grid[rng.random(des_fungi_grid.shape) < 0.3] = 0
+
+    np.testing.assert_allclose(numba_backend.calc_huge_fungus_grids(des_fungi_grid),
+                               numpy_backend.calc_huge_fungus_grids(des_fungi_grid),
+                               rtol=RTOL, atol=ATOL)
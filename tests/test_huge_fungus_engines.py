@@ -0,0 +1,54 @@
+"""
+Checks the vectorised huge fungus model (calc_huge_fungus_grids) against the original voxel by
+voxel loop it replaced (reference_huge_fungus_grids), on the desired fungi grids of seeded random
+dispenser layouts.
+"""
+import numpy as np
+import pytest
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import calc_huge_fungus_grids
+from src.Playerless_Core_Tools_Backend import calculate_distribution, \
+    reference_huge_fungus_grids
+
+# Both add up the same chances in the same order, so they should agree to within rounding
+RTOL = 1e-12
+ATOL = 1e-15
+# (length, width) of the platforms tested, including non-square and 1 block wide ones
+SIZES = ((1, 1), (1, 4), (3, 5), (5, 5), (6, 4))
+SEEDS = range(3)
+
+def random_layout(length, width, nylium_type, seed) -> PlayerlessCore:
+    """A random layout of up to 4 dispensers, some cleared, with the odd blocked block"""
+    rng = np.random.default_rng(seed)
+    cells = rng.permutation(length * width)
+    num_disps = min(rng.integers(1, 5), len(cells))
+    num_blocked = rng.integers(0, len(cells) - num_disps + 1) // 4
+    disp_coords = [Dispenser(int(cell // width), int(cell % width), n,
+                             int(rng.integers(UNCLEARED, CLEARED + 1)))
+                   for n, cell in enumerate(cells[:num_disps])]
+    blocked_blocks = [(int(cell // width), int(cell % width))
+                      for cell in cells[num_disps:num_disps + num_blocked]]
+    return PlayerlessCore(num_disps, disp_coords, Dimensions(length, width), nylium_type,
+                          int(rng.integers(1, 3)), blocked_blocks, 120, 1.0, 1, False)
+
+@pytest.mark.parametrize("nylium_type", (WARPED, CRIMSON))
+@pytest.mark.parametrize("length, width", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_reference(length, width, nylium_type, seed):
+    L = random_layout(length, width, nylium_type, seed)
+    des_fungi_grid = calculate_distribution(L).total_des_fungi_grid
+
+    np.testing.assert_allclose(calc_huge_fungus_grids(des_fungi_grid),
+                               reference_huge_fungus_grids(des_fungi_grid), rtol=RTOL, atol=ATOL)
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_reference_with_empty_cells(seed):
+    """Cells without any fungi are skipped by the vectorised model, but not the reference"""
+    rng = np.random.default_rng(seed)
+    des_fungi_grid = rng.random((4, 6)) * CRMS_FUNG_CHANCE
+    des_fungi_grid[rng.random(des_fungi_grid.shape) < 0.3] = 0
+
+    np.testing.assert_allclose(calc_huge_fungus_grids(des_fungi_grid),
+                               reference_huge_fungus_grids(des_fungi_grid), rtol=RTOL, atol=ATOL)
@@ -0,0 +1,54 @@
+"""
+Checks IncrementalFungDist, which only re-simulates a layout from its first moved dispenser, scores
+every layout exactly the same as simulating it in full with fast_calc_fung_dist, over random
+sequences of annealing moves that are randomly accepted or thrown away.
+"""
+import numpy as np
+import pytest
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import IncrementalFungDist, fast_calc_fung_dist, \
+    compile_blocked_mask
+from src.Stochastic_Optimisation import generate_neighbour, random_solution
+
+# Moves made in each sequence, and the chance each one's accepted
+NUM_MOVES = 200
+ACCEPT_CHANCE = 0.5
+# (length, width, dispensers, cycles, blocked blocks) of the platforms tested
+CONFIGS = (
+    (5, 5, 3, 1, []),
+    (7, 4, 5, 2, [(0, 0), (3, 2)]),
+    (1, 6, 3, 1, []),
+    (8, 8, 8, 3, [(4, 4)]),
+)
+
+@pytest.mark.parametrize("nylium_type", (WARPED, CRIMSON))
+@pytest.mark.parametrize("length, width, num_disps, cycles, blocked_blocks", CONFIGS)
+@pytest.mark.parametrize("has_cleared", (False, True))
+@pytest.mark.parametrize("dtype", (np.float64, np.float32))
+def test_matches_full_simulation(nylium_type, length, width, num_disps, cycles, blocked_blocks,
+                                 has_cleared, dtype):
+    rng = np.random.default_rng(length * width + num_disps + cycles)
+    size = Dimensions(length, width)
+    blocked_mask = compile_blocked_mask(length, width, blocked_blocks)
+    L = PlayerlessCore(num_disps, [], size, nylium_type, cycles, blocked_blocks, 120, 1.0, 1,
+                       False)
+    evaluator = IncrementalFungDist(length, width, nylium_type, cycles, blocked_mask,
+                                    dtype=dtype)
+
+    current = random_solution(L, has_cleared, blocked_mask, rng)
+    assert evaluator.evaluate(current) == fast_calc_fung_dist(
+        length, width, nylium_type, current, cycles, blocked_mask, dtype=dtype)
+    evaluator.accept()
+    for _ in range(NUM_MOVES):
+        neighbour = generate_neighbour(current, size, has_cleared, blocked_mask, rng)
+        assert evaluator.evaluate(neighbour) == fast_calc_fung_dist(
+            length, width, nylium_type, neighbour, cycles, blocked_mask, dtype=dtype)
+        if rng.random() < ACCEPT_CHANCE:
+            evaluator.accept()
+            current = neighbour
+
+    # Re-evaluating the accepted layout gives back its result unchanged
+    assert evaluator.evaluate(current) == fast_calc_fung_dist(
+        length, width, nylium_type, current, cycles, blocked_mask, dtype=dtype)
@@ -0,0 +1,63 @@
+"""
+Builds a small layout atlas and checks its layouts come back out of lookup_layout_atlas.
+"""
+import numpy as np
+import pytest
+
+from src.Assets.constants import *
+from src.Assets.data_classes import *
+from src.Fast_Dispenser_Distribution import fast_calc_fung_dist
+import src.Playerless_Core_Tools_Backend as backend
+
+# Configurations filled in: platforms up to 2x2, 1 cycle and up to 2 dispensers
+MAX_SIDE = 2
+MAX_DISPS = 2
+RUN_TIME = 0.2
+
+@pytest.fixture(scope="module")
+def atlas_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("atlas") / "layout_atlas.bin"
+    backend.build_layout_atlas(str(path), workers=1, run_time=RUN_TIME, max_side=MAX_SIDE,
+                               max_cycles=1, max_disps=MAX_DISPS)
+    return path
+
+@pytest.fixture
+def atlas(atlas_path, monkeypatch):
+    atlas = backend.open_layout_atlas(str(atlas_path))
+    monkeypatch.setattr(backend, "layout_atlas", atlas)
+    return atlas
+
+def standard_config(nylium_type, length, width, num_disps, cycles=1) -> PlayerlessCore:
+    return PlayerlessCore(num_disps, [], Dimensions(length, width), nylium_type, cycles, [],
+                          backend.ALL_WB_PER_FUNGUS, 1.0, 1, False)
+
+def test_header_matches(atlas_path):
+    assert backend.open_layout_atlas(str(atlas_path)) is not None
+
+@pytest.mark.parametrize("nylium_type", backend.ATLAS_NYLIUM_TYPES)
+@pytest.mark.parametrize("length, width", ((1, 1), (1, 2), (2, 1), (2, 2)))
+@pytest.mark.parametrize("num_disps", range(1, MAX_DISPS + 1))
+def test_lookup_round_trips(atlas, nylium_type, length, width, num_disps):
+    if num_disps > length * width:
+        pytest.skip("More dispensers than blocks")
+    L = standard_config(nylium_type, length, width, num_disps)
+    entry = backend.lookup_layout_atlas(L)
+    assert entry is not None
+    disp_coords, total_des_fungi = entry
+
+    record = atlas[nylium_type, length - 1, width - 1, 0, num_disps - 1]
+    stored = [(d.row, d.col) for d in disp_coords]
+    assert stored == [tuple(pos) for pos in record["layout"][:num_disps].tolist()]
+    assert len(set(stored)) == num_disps
+    assert all(0 <= row < length and 0 <= col < width for row, col in stored)
+    # Stored in single precision, but looked up in full
+    assert total_des_fungi == pytest.approx(float(record["fungi"]), rel=1e-6)
+    assert total_des_fungi == fast_calc_fung_dist(length, width, nylium_type, disp_coords, 1,
+                                                  [])[0]
+
+def test_unfilled_and_non_standard_configs_miss(atlas):
+    # Built without any 2 cycle records
+    assert backend.lookup_layout_atlas(standard_config(CRIMSON, 2, 2, 1, cycles=2)) is None
+    L = standard_config(CRIMSON, 2, 2, 1)
+    L.blocked_blocks = [(0, 0)]
+    assert backend.lookup_layout_atlas(L) is None